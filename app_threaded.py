@@ -1,11 +1,9 @@
 import customtkinter
-import yt_dlp
 import os
 import sys
 import threading
 import subprocess
-from PIL import Image, ImageTk
-import requests
+import contextlib
 from io import BytesIO
 import tkinter.filedialog
 import tkinter
@@ -14,6 +12,71 @@ import queue
 import time
 import uuid
 import json
+import heapq
+import itertools
+import hashlib
+import functools
+import glob
+import errno
+import copy
+import shutil
+import concurrent.futures
+import argparse
+import re
+import sqlite3
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs, quote
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access
+
+    yt-dlp (with its ~1800 extractors), Pillow and requests are only needed
+    once the user fetches something, so they stay out of the startup path.
+    ``loader`` does the import with a plain import statement, which keeps the
+    module visible to PyInstaller's analysis of the frozen build.
+    """
+    def __init__(self, loader):
+        self._loader = loader
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = self._loader()
+        return getattr(self._module, attr)
+
+def _load_yt_dlp():
+    import yt_dlp
+    return yt_dlp
+
+def _load_image():
+    from PIL import Image
+    return Image
+
+def _load_requests():
+    import requests
+    return requests
+
+def _load_urlrequest():
+    import urllib.request
+    return urllib.request
+
+yt_dlp = LazyModule(_load_yt_dlp)
+Image = LazyModule(_load_image)
+requests = LazyModule(_load_requests)
+urlrequest = LazyModule(_load_urlrequest)
+
+CONFIG_FILE = os.path.join(os.path.expanduser("~"), ".youtube_downloader_config.json")
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".youtube_downloader_cache")
+# Request progressive HTTP streams in ranges; unchunked YouTube requests get throttled
+HTTP_CHUNK_SIZE = 10 * 1024 * 1024
+FFMPEG_PROBE_CACHE = os.path.join(CACHE_DIR, "ffmpeg_probe.json")
+JOURNAL_FILE = os.path.join(CACHE_DIR, "jobs.sqlite3")
+DAEMON_JOURNAL_FILE = os.path.join(CACHE_DIR, "daemon-jobs.sqlite3")
+ARCHIVE_FILE = os.path.join(CACHE_DIR, "archive.sqlite3")
+METRICS_FILE = os.path.join(CACHE_DIR, "metrics.jsonl")
+PROMETHEUS_FILE = os.path.join(CACHE_DIR, "metrics.prom")
+# Per-job raw stream files awaiting post-processing ("<title>.<job>.f<format>.<ext>")
+RAW_STREAM_NAME = re.compile(r'\.[0-9a-f]{8}\.f[^.]+\.[^.]+$')
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -23,60 +86,1754 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def host_key(url):
+    """Return the host a URL is rate-limited by, e.g. youtu.be -> youtube.com"""
+    host = (urlparse(url).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return HOST_ALIASES.get(host, host)
+
+HOST_ALIASES = {
+    'youtu.be': 'youtube.com',
+    'youtube-nocookie.com': 'youtube.com',
+}
+
+def run_quiet(args, timeout=15):
+    """Run a command capturing its output, without a console window on Windows"""
+    return subprocess.run(
+        args,
+        check=True,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    )
+
+def _ffmpeg_candidates():
+    """Possible ffmpeg binaries: bundled copy first, then system PATH"""
+    exe = '.exe' if os.name == 'nt' else ''
+    candidates = [resource_path(os.path.join("ffmpeg", "bin", "ffmpeg" + exe))]  # PyInstaller compatible
+    system_ffmpeg = shutil.which("ffmpeg")
+    if system_ffmpeg:
+        candidates.append(system_ffmpeg)
+    return [path for path in candidates if os.path.isfile(path)]
+
+def _parse_ffmpeg_list(output, separator):
+    """Names from an ffmpeg -encoders/-muxers listing, after its separator line"""
+    names = []
+    started = False
+    for line in output.splitlines():
+        if not started:
+            started = line.strip().startswith(separator)
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            names.extend(parts[1].split(','))
+    return names
+
+def _probe_ffmpeg_binary(path):
+    """Run ffmpeg once for version, encoders, muxers and hwaccels"""
+    version = run_quiet([path, "-hide_banner", "-version"]).stdout.splitlines()[0]
+    encoders = run_quiet([path, "-hide_banner", "-encoders"]).stdout
+    muxers = run_quiet([path, "-hide_banner", "-muxers"]).stdout
+    hwaccels = run_quiet([path, "-hide_banner", "-hwaccels"]).stdout.splitlines()
+    ffprobe = os.path.join(os.path.dirname(path), "ffprobe" + os.path.splitext(path)[1])
+    return {
+        'ffmpeg': path,
+        'ffprobe': ffprobe if os.path.isfile(ffprobe) else shutil.which("ffprobe"),
+        'location': os.path.dirname(path),
+        'version': version,
+        'encoders': _parse_ffmpeg_list(encoders, '------'),
+        'muxers': _parse_ffmpeg_list(muxers, '--'),
+        'hwaccels': [line.strip() for line in hwaccels[1:] if line.strip()],
+    }
+
+@functools.lru_cache(maxsize=1)
+def probe_ffmpeg():
+    """Locate ffmpeg once per process and return its capabilities, or None
+
+    Probe results are memoized on disk keyed by binary path, mtime and size,
+    so only the first launch after installing/updating ffmpeg spawns it.
+    """
+    try:
+        with open(FFMPEG_PROBE_CACHE, 'r', encoding='utf-8') as f:
+            disk_cache = json.load(f)
+    except (OSError, ValueError):
+        disk_cache = {}
+
+    for path in _ffmpeg_candidates():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stamp = [stat.st_mtime, stat.st_size]
+        cached = disk_cache.get(path)
+        if cached and cached.get('stamp') == stamp:
+            return cached['probe']
+        try:
+            probe = _probe_ffmpeg_binary(path)
+        except (subprocess.SubprocessError, OSError, IndexError):
+            continue
+        disk_cache[path] = {'stamp': stamp, 'probe': probe}
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(FFMPEG_PROBE_CACHE, 'w', encoding='utf-8') as f:
+                json.dump(disk_cache, f, indent=2)
+        except OSError as e:
+            print(f"Error saving ffmpeg probe: {e}")
+        return probe
+    return None
+
+def ffmpeg_supports(kind, name):
+    """Whether the probed ffmpeg has an encoder/muxer/hwaccel, e.g. ('encoders', 'libmp3lame')"""
+    probe = probe_ffmpeg()
+    return bool(probe) and name in probe.get(kind, [])
+
+@functools.lru_cache(maxsize=4096)
+def canonical_key(url):
+    """Return an 'Extractor:video_id' key for a URL without any network access
+
+    Different URL spellings of the same video (youtu.be/X, watch?v=X, ...)
+    map to the same key. Only video extractors give a key: a playlist ID
+    would be shared by every video opened from that playlist. URLs no video
+    extractor claims fall back to the URL.
+    """
+    extractors = [ie for ie in yt_dlp.extractor.gen_extractor_classes() if ie.ie_key() != 'Generic']
+    claimed = next((ie for ie in extractors if ie.suitable(url)), None)
+    if claimed is not None and claimed._RETURN_TYPE == 'video':
+        video_id = claimed.get_temp_id(url)
+        return f"{claimed.ie_key()}:{video_id}" if video_id else f"url:{url}"
+    # A playlist-capable extractor claims URLs like watch?v=X&list=PL...; details
+    # are extracted with noplaylist, so key on the video named in the URL
+    for ie in extractors:
+        if ie is not claimed and ie._match_valid_url(url) and ie._RETURN_TYPE == 'video':
+            video_id = ie.get_temp_id(url)
+            if video_id:
+                return f"{ie.ie_key()}:{video_id}"
+    return f"url:{url}"
+
+class InfoCache:
+    """In-memory LRU plus on-disk cache of sanitized yt-dlp info dicts
+
+    Entries are keyed by canonical_key() and expire after ``ttl`` seconds, or
+    earlier when the signed stream URLs in the info dict expire. The disk tier
+    keeps at most ``max_disk_entries`` files, dropping the least recently
+    written first.
+    """
+    # Treat stream URLs as expired this many seconds before their deadline
+    EXPIRY_MARGIN = 300
+
+    def __init__(self, cache_dir=None, ttl=6 * 3600, max_entries=128, max_disk_entries=1024):
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, "info")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        """Disk location of a cache entry"""
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        """Return the cached info dict for a URL, or None if missing or expired"""
+        key = canonical_key(url)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry['expires'] > now:
+                    self._entries.move_to_end(key)
+                    return entry['info']
+                del self._entries[key]
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except OSError:
+            return None
+        except ValueError:
+            entry = None
+        if not isinstance(entry, dict) or entry.get('key') != key or entry.get('expires', 0) <= now:
+            # Corrupt or expired; nothing will read it again
+            self._remove(path)
+            return None
+        self._remember(key, entry)
+        return entry['info']
+
+    def put(self, url, info_dict):
+        """Cache an info dict for a URL and return its sanitized copy"""
+        # Private keys include the previous format selection ('requested_formats'),
+        # which would otherwise leak into later process_ie_result() calls
+        info = yt_dlp.YoutubeDL.sanitize_info(info_dict, remove_private_keys=True)
+        entry = {'key': canonical_key(url), 'expires': self._expiry(info), 'info': info}
+        self._remember(entry['key'], entry)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._path(entry['key']) + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(entry['key']))
+            self._prune_disk()
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing info cache: {e}")
+        return info
+
+    def invalidate(self, url):
+        """Drop a URL's entry from memory and disk"""
+        key = canonical_key(url)
+        with self._lock:
+            self._entries.pop(key, None)
+        self._remove(self._path(key))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _prune_disk(self):
+        """Delete the oldest cache files beyond ``max_disk_entries``"""
+        files = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json'):
+                    try:
+                        files.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort()
+        for _, path in files[:len(files) - self.max_disk_entries]:
+            self._remove(path)
+
+    def _remember(self, key, entry):
+        """Insert into the memory LRU, evicting the oldest entries"""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _expiry(self, info):
+        """Earliest of the TTL and the signed stream URLs' expire= deadlines"""
+        expires = time.time() + self.ttl
+        for f in info.get('formats') or [info]:
+            deadline = parse_qs(urlparse(f.get('url') or '').query).get('expire')
+            if deadline and deadline[0].isdigit():
+                expires = min(expires, int(deadline[0]) - self.EXPIRY_MARGIN)
+        return expires
+
+# Sort order for mp4 downloads and the selector used when a quality is missing
+MP4_FORMAT_SORT = ('res', 'ext:mp4:m4a')
+FALLBACK_MP4_FORMAT = 'best[ext=mp4]/bestvideo[ext=mp4]+bestaudio[ext=m4a]/best'
+
+@functools.lru_cache(maxsize=8)
+def _selector_ydl(format_sort=()):
+    """A YoutubeDL used only to parse format selectors and sort formats"""
+    return yt_dlp.YoutubeDL({'quiet': True, 'format_sort': list(format_sort)})
+
+def sort_formats(formats, format_sort=()):
+    """Copies of ``formats`` in yt-dlp's preference order for ``format_sort``
+
+    Sorting dominates resolve_format(); resolve many selectors against one
+    list by sorting it once and passing ``presorted=True``.
+    """
+    formats = [dict(f) for f in formats]
+    if format_sort:
+        _selector_ydl(tuple(format_sort)).sort_formats({'formats': formats})
+    return formats
+
+def resolve_format(formats, format_spec, format_sort=(), presorted=False):
+    """Resolve a format selector against an extracted formats list, without network
+
+    Returns the chosen formats (video and audio for a merge, else one) or None
+    when the selector matches nothing. With ``presorted`` the list is the
+    output of sort_formats() with the same ``format_sort``.
+    """
+    ydl = _selector_ydl(tuple(format_sort))
+    if not presorted:
+        formats = sort_formats(formats, format_sort)
+    selector = ydl.build_format_selector(format_spec)
+    chosen = next(iter(selector({
+        'formats': formats,
+        'has_merged_format': any('none' not in (f.get('acodec'), f.get('vcodec')) for f in formats),
+        'incomplete_formats': (all(f.get('vcodec') == 'none' for f in formats)
+                               or all(f.get('acodec') == 'none' for f in formats)),
+    })), None)
+    if chosen is None:
+        return None
+    return chosen.get('requested_formats') or [chosen]
+
+def estimate_size(fmt, duration=None):
+    """Expected size of a format in bytes: filesize, filesize_approx, else tbr x duration (0 if unknown)"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    tbr = fmt.get('tbr')
+    duration = fmt.get('duration') or duration
+    return int(tbr * 125 * duration) if tbr and duration else 0  # tbr is in kbit/s
+
+def place_file(source, destination):
+    """Move a finished file to its destination under its final name in one step
+
+    A rename when both are on one filesystem; otherwise a streamed copy to a
+    .part name next to the destination, renamed over it once complete.
+    """
+    os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+    try:
+        os.replace(source, destination)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    # Unique per thread: jobs with the same title may be placing at once
+    temp_path = f"{destination}.{threading.get_ident()}.part"
+    try:
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    os.remove(source)
+
+def existing_parent(path):
+    """``path`` or its nearest existing ancestor, for disk usage queries"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+class SingleFlight:
+    """Collapses concurrent work for the same key into one call
+
+    The first caller to claim() a key owns it and must settle() it; everyone
+    else gets the owner's Future. A key is released as soon as it settles, so
+    later callers start fresh (and normally hit a cache the owner filled).
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """Return (future, owner) for a key"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = concurrent.futures.Future()
+            return future, True
+
+    def settle(self, key, result=None, error=None):
+        """Publish the owner's result (or exception) to every waiter"""
+        with self._lock:
+            future = self._calls.pop(key)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, key, fn):
+        """Call fn() unless the same key is already running; either way return its result"""
+        future, owner = self.claim(key)
+        if owner:
+            try:
+                result = fn()
+            except Exception as e:
+                self.settle(key, error=e)
+                raise
+            self.settle(key, result)
+            return result
+        return future.result()
+
+def _lists_videos(entry):
+    """Whether a flat 'url' entry points at a listing (tab, playlist) rather than a video"""
+    if entry.get('_type') not in ('url', 'url_transparent') or not entry.get('ie_key'):
+        return False
+    try:
+        return yt_dlp.extractor.get_info_extractor(entry['ie_key'])._RETURN_TYPE != 'video'
+    except KeyError:
+        return False
+
+def _walk_playlist(info_dict, seen):
+    """Yield {'url', 'title'} for each entry, descending into sub-playlists and channel tabs"""
+    for entry in info_dict.get('entries') or []:
+        if not entry:
+            continue
+        if entry.get('_type') in ('playlist', 'multi_video'):
+            yield from _walk_playlist(entry, seen)
+            continue
+        entry_url = entry.get('webpage_url') or entry.get('url')
+        if not entry_url:
+            continue
+        if _lists_videos(entry):
+            if entry_url not in seen:
+                yield from iter_playlist_entries(entry_url, seen)
+            continue
+        yield {'url': entry_url, 'title': entry.get('title') or entry_url}
+
+def iter_playlist_entries(url, seen=None):
+    """Lazily yield the entries of a playlist or channel URL
+
+    Uses flat, lazy extraction so entries come out page by page while the
+    rest of a large channel is still being listed. Entries that are
+    themselves listings (a channel's tabs, a tab's playlists) are expanded;
+    ``seen`` holds the listing URLs already visited.
+    """
+    seen = set() if seen is None else seen
+    seen.add(url)
+    ydl_opts = {
+        'quiet': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'skip_download': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(url, download=False, process=False)
+        if info_dict.get('_type') not in ('playlist', 'multi_video'):
+            yield {'url': url, 'title': info_dict.get('title') or url}
+            return
+        yield from _walk_playlist(info_dict, seen)
+
+class ProgressBus:
+    """Coalesces per-job download progress and publishes it at a fixed rate
+
+    Producers call update() as often as they like (every chunk); subscribers
+    get at most ``rate_hz`` batches per second holding the latest state of each
+    job that changed, with speed and ETA smoothed by an exponential average.
+    """
+    def __init__(self, rate_hz=10, smoothing=0.3, sample_interval=0.25):
+        self.interval = 1.0 / rate_hz
+        self.smoothing = smoothing
+        self.sample_interval = sample_interval
+        self._states = {}
+        self._dirty = set()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._publish_loop, name="progress-bus", daemon=True)
+        self._thread.start()
+
+    def subscribe(self, callback):
+        """Register callback(states) to receive each batch of job states"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stop delivering batches to a callback"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def update(self, job_id, downloaded_bytes, total_bytes=None, **extra):
+        """Record the latest byte counts of a job"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(job_id)
+            if state is None:
+                state = self._states[job_id] = {
+                    'job_id': job_id,
+                    'speed_bps': None,
+                    '_sample_time': now,
+                    '_sample_bytes': downloaded_bytes,
+                }
+            if downloaded_bytes < state['_sample_bytes']:
+                # A new stream of the same job started (e.g. audio after video)
+                state['_sample_time'], state['_sample_bytes'] = now, downloaded_bytes
+            elapsed = now - state['_sample_time']
+            if elapsed >= self.sample_interval:
+                rate = (downloaded_bytes - state['_sample_bytes']) / elapsed
+                if state['speed_bps'] is None:
+                    state['speed_bps'] = rate
+                else:
+                    state['speed_bps'] += self.smoothing * (rate - state['speed_bps'])
+                state['_sample_time'], state['_sample_bytes'] = now, downloaded_bytes
+            state['downloaded_bytes'] = downloaded_bytes
+            state['total_bytes'] = total_bytes
+            state.update(extra)
+            self._dirty.add(job_id)
+
+    def discard(self, job_id):
+        """Forget a finished job; no batch mentioning it is delivered afterwards"""
+        with self._publish_lock, self._lock:
+            self._states.pop(job_id, None)
+            self._dirty.discard(job_id)
+
+    def snapshot(self, job_id):
+        """Return the current public state of a job, or None"""
+        with self._lock:
+            state = self._states.get(job_id)
+            return self._public_state(state) if state else None
+
+    def _publish_loop(self):
+        """Deliver dirty job states to subscribers every interval"""
+        while True:
+            time.sleep(self.interval)
+            with self._publish_lock:
+                with self._lock:
+                    if not self._dirty:
+                        continue
+                    states = [self._public_state(self._states[job_id]) for job_id in self._dirty]
+                    self._dirty.clear()
+                    subscribers = list(self._subscribers)
+                for callback in subscribers:
+                    try:
+                        callback(states)
+                    except Exception as e:
+                        print(f"Progress subscriber error: {e}")
+
+    @staticmethod
+    def _public_state(state):
+        """Copy of a state with derived progress, ETA and display strings"""
+        public = {key: value for key, value in state.items() if not key.startswith('_')}
+        downloaded, total, speed = state['downloaded_bytes'], state['total_bytes'], state['speed_bps']
+        progress = downloaded / total if total else None
+        eta = (total - downloaded) / speed if total and speed else None
+        public.update({
+            'progress': progress,
+            'eta_seconds': eta,
+            'percent': f"{progress * 100:.1f}%" if progress is not None else '',
+            'speed': f"{yt_dlp.utils.format_bytes(speed)}/s" if speed else '',
+            'eta': yt_dlp.utils.formatSeconds(int(eta)) if eta is not None else '',
+        })
+        return public
+
+class FragmentTuner:
+    """Picks concurrent_fragment_downloads for DASH/HLS jobs from measured throughput
+
+    Per host and stream kind ('video' or 'audio', whose fragment sizes and
+    throughput differ widely) it remembers the last concurrency tried and the
+    throughput it gave. Concurrency doubles while that keeps raising
+    throughput by at least ``gain_threshold``, steps back once it stops
+    scaling, and halves after an error or when throughput falls below
+    ``drop_threshold`` of the previous sample (throttling that fails no
+    fragments); either way the level that did not pay off becomes a ceiling
+    that later probes stay under. All jobs draw their fragment connections
+    from one global budget of ``global_cap`` sockets.
+    """
+    def __init__(self, global_cap=32, initial=4, max_per_job=16, gain_threshold=1.15, drop_threshold=0.7):
+        self.global_cap = global_cap
+        self.initial = initial
+        self.max_per_job = max_per_job
+        self.gain_threshold = gain_threshold
+        self.drop_threshold = drop_threshold
+        self._hosts = {}
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, host, stream='video'):
+        """Reserve fragment connections for a job's stream on a host; returns the count (>= 1)"""
+        with self._lock:
+            wanted = self._hosts.get((host, stream), {}).get('concurrency', self.initial)
+            granted = max(1, min(wanted, self.global_cap - self._in_use))
+            self._in_use += granted
+            return granted
+
+    def release(self, count):
+        """Return connections reserved by acquire()"""
+        with self._lock:
+            self._in_use = max(0, self._in_use - count)
+
+    def report(self, host, concurrency, throughput_bps, errors=0, stream='video'):
+        """Feed back how a stream downloaded at ``concurrency`` performed"""
+        with self._lock:
+            state = self._hosts.setdefault((host, stream), {'concurrency': self.initial, 'last': None, 'ceiling': None})
+            last = state['last']
+            if errors:
+                state['ceiling'] = concurrency
+                state['concurrency'] = max(1, concurrency // 2)
+                state['last'] = None
+                return
+            if last is not None and throughput_bps < last[1] * self.drop_threshold:
+                # Throughput collapsed without failed fragments (e.g. throttling
+                # of many connections): back off as after an error
+                state['ceiling'] = concurrency
+                state['concurrency'] = max(1, concurrency // 2)
+            elif last is None or concurrency <= last[0] or throughput_bps >= last[1] * self.gain_threshold:
+                # First sample, or the extra connections paid off: probe higher
+                target = concurrency * 2
+                if state['ceiling']:
+                    # Bisect towards the level known not to help
+                    target = min(target, (concurrency + state['ceiling']) // 2)
+                state['concurrency'] = max(concurrency, min(self.max_per_job, target))
+            else:
+                # Throughput stopped scaling; settle on the previous level and
+                # only probe below this one from now on
+                state['ceiling'] = concurrency
+                state['concurrency'] = last[0]
+            state['last'] = (concurrency, throughput_bps)
+
+class BandwidthLimiter:
+    """Process-wide download budget shared fairly between running jobs
+
+    A token bucket per job refilled at ``rate / active jobs`` bytes/s, so a
+    job with many fragment connections gets no more than one with a single
+    stream, and the share of idle jobs goes back to the rest. ``schedule``
+    holds (start_hour, end_hour, rate) windows in local time, e.g.
+    ``[(9, 18, 2_500_000)]``; outside them ``rate`` applies. A rate of None
+    means unlimited. set_rate()/set_schedule() take effect on running jobs
+    within SLICE seconds.
+    """
+    SLICE = 0.25          # Longest single sleep, so rate changes apply quickly
+    ACTIVE_WINDOW = 2.0   # A job counts towards the share while it moves data
+    BURST_SECONDS = 1.0
+
+    def __init__(self, rate=None, schedule=None, clock=time.time):
+        self.rate = rate
+        self.schedule = list(schedule or [])
+        self._clock = clock
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        """Change the default rate (bytes/s, None for unlimited)"""
+        with self._lock:
+            self.rate = rate
+
+    def set_schedule(self, schedule):
+        """Replace the time-of-day windows"""
+        with self._lock:
+            self.schedule = list(schedule or [])
+
+    def current_rate(self):
+        """Rate in force right now, from the schedule or the default"""
+        now = time.localtime(self._clock())
+        hour = now.tm_hour + now.tm_min / 60
+        for start, end, rate in self.schedule:
+            if (start <= hour < end) if start <= end else (hour >= start or hour < end):
+                return rate
+        return self.rate
+
+    def consume(self, job_id, nbytes):
+        """Charge ``nbytes`` to a job, sleeping until its share has paid for them
+
+        Returns early if the job is released meanwhile (e.g. cancelled).
+        """
+        charged = False
+        while True:
+            with self._lock:
+                if charged and job_id not in self._jobs:
+                    return
+                rate = self.current_rate()
+                if not rate:
+                    self._jobs.pop(job_id, None)
+                    return
+                now = time.monotonic()
+                for other in [j for j, state in self._jobs.items() if now - state['seen'] > self.ACTIVE_WINDOW]:
+                    if other != job_id:
+                        del self._jobs[other]
+                share = rate / (len(self._jobs) + (job_id not in self._jobs))
+                state = self._jobs.setdefault(job_id, {'tokens': 0.0, 'updated': now, 'seen': now})
+                state['tokens'] = min(share * self.BURST_SECONDS, state['tokens'] + (now - state['updated']) * share)
+                state['updated'] = now
+                state['seen'] = now
+                if not charged:
+                    state['tokens'] -= nbytes
+                    charged = True
+                if state['tokens'] >= 0:
+                    return
+                wait = min(self.SLICE, -state['tokens'] / share)
+            time.sleep(wait)
+
+    def release(self, job_id):
+        """Forget a job once its transfer ends, so its share is redistributed"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    @classmethod
+    def from_config(cls, path=None):
+        """Limiter from the config file's bandwidth settings (Mbit/s)
+
+        ``"bandwidth_limit_mbps": 50`` sets the default rate and
+        ``"bandwidth_schedule": [[9, 18, 20]]`` limits office hours to 20 Mbit/s;
+        null in either place means full speed.
+        """
+        try:
+            with open(path or CONFIG_FILE, 'r') as f:
+                config = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            config = {}
+        try:
+            return cls(mbps(config.get('bandwidth_limit_mbps')),
+                       [(start, end, mbps(rate)) for start, end, rate in config.get('bandwidth_schedule') or []])
+        except (TypeError, ValueError) as e:
+            print(f"Ignoring invalid bandwidth settings: {e}")
+            return cls()
+
+def mbps(value):
+    """Megabits per second (as configured) to bytes per second; None stays unlimited"""
+    return None if value is None else float(value) * 125000
+
+class JobMetrics:
+    """Per-job stage timings and counters, exported as JSON Lines and Prometheus text
+
+    Jobs are timed in stages (queue, extract, resolve, transfer, merge,
+    remux, postprocess); a stage entered twice, such as the video and audio
+    transfers of one job, accumulates. When a job finishes its record is
+    appended to ``path`` as one JSON line, and the process-wide totals -
+    per-stage latency histograms, job/byte/retry counters - are rewritten to
+    ``prometheus_path`` for a textfile collector. Without paths nothing is
+    written and render_prometheus() is the only export.
+    """
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+    def __init__(self, path=None, prometheus_path=None):
+        self.path = path
+        self.prometheus_path = prometheus_path
+        self._jobs = {}
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def start(self, job_id, **fields):
+        """Begin a job record; ``fields`` (url, host, format_type, ...) are exported with it"""
+        with self._lock:
+            self._jobs[job_id] = dict(fields, job_id=job_id, spans={}, bytes=0, retries=0)
+
+    @contextlib.contextmanager
+    def span(self, job_id, stage):
+        """Time the enclosed block as ``stage`` of a job (or only in the histograms if job_id is None)"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_span(job_id, stage, time.monotonic() - started)
+
+    def add_span(self, job_id, stage, seconds):
+        """Record time spent in a stage"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['spans'][stage] = job['spans'].get(stage, 0.0) + seconds
+            histogram = self._histograms.setdefault(stage, {'buckets': [0] * len(self.BUCKETS), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def count(self, job_id, name, amount=1):
+        """Add to a job counter ('bytes' or 'retries') and its process total"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job[name] = job.get(name, 0) + amount
+            self._increment(name, amount)
+
+    def increment(self, name, amount=1, **labels):
+        """Add to a process-wide counter, e.g. increment('worker_errors', lane='metadata')"""
+        with self._lock:
+            self._increment(name, amount, **labels)
+
+    def _increment(self, name, amount, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def finish(self, job_id, status, error=None):
+        """Close a job record and export it; returns the record (None if unknown)"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            self._increment('jobs', 1, status=status)
+        if job is None:
+            return None
+        transfer = job['spans'].get('transfer')
+        job.update(status=status, error=error, finished_at=time.time(),
+                   total_seconds=sum(job['spans'].values()),
+                   transfer_bps=job['bytes'] / transfer if transfer else None)
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(job, default=str) + "\n")
+            except OSError as e:
+                print(f"Error writing job metrics: {e}")
+        self.flush()
+        return job
+
+    def render_prometheus(self):
+        """Process totals in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = {stage: dict(h, buckets=list(h['buckets'])) for stage, h in self._histograms.items()}
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"ytdl_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_text = ','.join(f'{key}="{value_}"' for key, value_ in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        if histograms:
+            lines.append("# HELP ytdl_stage_seconds Time spent per job stage")
+            lines.append("# TYPE ytdl_stage_seconds histogram")
+        for stage, histogram in sorted(histograms.items()):
+            for bound, count in zip(self.BUCKETS, histogram['buckets']):
+                lines.append(f'ytdl_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'ytdl_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'ytdl_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+            lines.append(f'ytdl_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Write the Prometheus file now (it is otherwise refreshed as jobs finish)"""
+        if self.prometheus_path:
+            self.write_prometheus(self.prometheus_path)
+
+    def write_prometheus(self, path):
+        """Atomically replace ``path`` with the current totals"""
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render_prometheus())
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing Prometheus metrics: {e}")
+
+class JobJournal:
+    """SQLite journal of download jobs, so queued and interrupted jobs survive restarts
+
+    Every state change is written through (WAL mode). unfinished() returns the
+    jobs that were still queued, running or paused when the process last
+    stopped; re-running them resumes from their .part files since continuedl is on.
+    The file is held exclusively while open, so a second process can't
+    resume (and download again) jobs the first is running; it gets an
+    sqlite3.OperationalError instead.
+    """
+    TASK_FIELDS = ('action', 'url', 'format_type', 'format_id', 'download_path', 'title', 'playlist_id',
+                   'archive_format', 'outputs')
+
+    def __init__(self, path=None, keep_finished_days=7):
+        self.path = path or JOURNAL_FILE
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=1, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+            try:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                self._conn.close()
+                raise sqlite3.OperationalError(f"{self.path} is in use by another process")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " task TEXT NOT NULL,"
+                " priority INTEGER NOT NULL,"
+                " status TEXT NOT NULL,"
+                " error TEXT,"
+                " submitted_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed', 'skipped', 'cancelled') AND updated_at < ?",
+                (time.time() - keep_finished_days * 86400,)
+            )
+
+    def record(self, job):
+        """Insert or replace a job as it is submitted"""
+        task = {field: job.get(field) for field in self.TASK_FIELDS}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job['job_id'], json.dumps(task), job['priority'], job['status'],
+                 job.get('error'), job['submitted_at'], time.time())
+            )
+
+    def update(self, job_id, status, error=None):
+        """Record a job's state change"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def unfinished(self):
+        """(job_id, task, priority, status) of every job not yet finished, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, task, priority, status FROM jobs"
+                " WHERE status IN ('queued', 'running', 'processing', 'paused') ORDER BY submitted_at"
+            ).fetchall()
+        return [(job_id, json.loads(task), priority, status) for job_id, task, priority, status in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class DownloadArchive:
+    """Record of finished downloads keyed by extractor, video ID and format
+
+    Keys are loaded into memory at startup, so checking whether a job was
+    already done costs a dict lookup and a stat() of the recorded file - no
+    extraction. An entry whose file was deleted no longer counts. With
+    ``hash_contents`` every finished file is also SHA-256 indexed, so a file
+    that was renamed within its directory is still found, and a download
+    identical to a file already there is dropped in favour of that file.
+    Hashing happens only in record(); lookup() spots a renamed file by the
+    size and mtime indexed with its digest, so it is safe on the GUI thread.
+    """
+    HASH_BLOCK = 1024 * 1024
+
+    def __init__(self, path=None, hash_contents=False):
+        self.path = path or ARCHIVE_FILE
+        self.hash_contents = hash_contents
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS archive ("
+                " key TEXT PRIMARY KEY,"
+                " path TEXT NOT NULL,"
+                " sha256 TEXT,"
+                " completed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " path TEXT PRIMARY KEY,"
+                " directory TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " sha256 TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_by_hash ON files (directory, sha256)")
+            self._entries = {
+                key: (path, sha256)
+                for key, path, sha256 in self._conn.execute("SELECT key, path, sha256 FROM archive")
+            }
+
+    @staticmethod
+    def key(url, format_type, format_spec):
+        return f"{canonical_key(url)}:{format_type}:{format_spec}"
+
+    def lookup(self, url, format_type, format_spec):
+        """Path of the archived file for this video and format, or None"""
+        key = self.key(url, format_type, format_spec)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        path, sha256 = entry
+        if os.path.exists(path):
+            return path
+        if self.hash_contents and sha256:
+            moved = self._find_renamed(os.path.dirname(path), sha256)
+            if moved:
+                self._store(key, moved, sha256)
+                return moved
+        return None
+
+    def record(self, url, format_type, format_spec, path):
+        """Archive a finished download; returns the path to keep (see class doc)"""
+        sha256 = None
+        if self.hash_contents:
+            sha256 = self.file_hash(path)
+            duplicate = self.find_content(os.path.dirname(path), sha256, exclude=path)
+            if duplicate:
+                os.remove(path)
+                with self._lock:
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                path = duplicate
+        self._store(self.key(url, format_type, format_spec), path, sha256)
+        return path
+
+    def _store(self, key, path, sha256):
+        with self._lock:
+            self._entries[key] = (path, sha256)
+            self._conn.execute("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?)", (key, path, sha256, time.time()))
+
+    def file_hash(self, path):
+        """SHA-256 of a file, reusing the indexed digest while size and mtime match"""
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, stat.st_size, stat.st_mtime_ns)
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(self.HASH_BLOCK), b''):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (path, os.path.dirname(path), stat.st_size, stat.st_mtime_ns, sha256)
+            )
+        return sha256
+
+    def index_directory(self, directory):
+        """Bring the content index of a directory up to date; unchanged files are not re-read"""
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        present = set()
+        for name in names:
+            path = os.path.join(directory, name)
+            if name.endswith(('.part', '.ytdl')) or RAW_STREAM_NAME.search(name) or not os.path.isfile(path):
+                continue
+            present.add(path)
+            try:
+                self.file_hash(path)
+            except OSError:
+                pass
+        with self._lock:
+            stale = [row[0] for row in self._conn.execute("SELECT path FROM files WHERE directory = ?", (directory,))
+                     if row[0] not in present]
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in stale])
+
+    def find_content(self, directory, sha256, exclude=None):
+        """A file in ``directory`` with the given digest, or None"""
+        self.index_directory(directory)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM files WHERE directory = ? AND sha256 = ? AND path != ? LIMIT 1",
+                (directory, sha256, exclude or '')
+            ).fetchone()
+        return row[0] if row else None
+
+    def _find_renamed(self, directory, sha256):
+        """A file in ``directory`` with an indexed copy's digest, matched by size and
+        mtime (which a rename keeps) without reading any file contents"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE directory = ? AND sha256 = ?",
+                (directory, sha256)
+            ).fetchall()
+        signatures = set()
+        for path, size, mtime_ns in rows:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                signatures.add((size, mtime_ns))
+                continue
+            if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns):
+                return path
+        if not signatures:
+            return None
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return None
+        for entry in entries:
+            if entry.name.endswith(('.part', '.ytdl')) or RAW_STREAM_NAME.search(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.is_file() and (stat.st_size, stat.st_mtime_ns) in signatures:
+                with self._lock:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                        (entry.path, directory, stat.st_size, stat.st_mtime_ns, sha256)
+                    )
+                return entry.path
+        return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# ffmpeg muxer per output extension; outputs are written under a .part name
+MUXERS = {'mp4': 'mp4', 'm4a': 'ipod', 'mp3': 'mp3'}
+
+def finalize_args(output_path, metadata=None):
+    """Trailing ffmpeg arguments of every output: tags and an explicit muxer"""
+    args = []
+    for key, value in (metadata or {}).items():
+        if value:
+            args += ['-metadata', f"{key}={value}"]
+    if output_path.endswith('.mp3'):
+        args += ['-id3v2_version', '3']  # Widest player support for tags and cover art
+    return args + ['-f', MUXERS[os.path.splitext(output_path)[1][1:]], output_path]
+
+def cover_args(cover_path, input_index, video_index):
+    """ffmpeg arguments embedding an image as cover art, re-encoded to JPEG (thumbnails may be WebP)"""
+    if not cover_path:
+        return [], []
+    return ['-i', cover_path], [
+        '-map', f'{input_index}:v:0', f'-c:v:{video_index}', 'mjpeg',
+        f'-disposition:v:{video_index}', 'attached_pic'
+    ]
+
+def merge_command(ffmpeg, video_path, audio_path, output_path, metadata=None, cover=None):
+    """ffmpeg arguments to mux separate video and audio streams into one file
+
+    Tags and cover art go in with the same pass, so the output is written once.
+    """
+    cover_input, cover_map = cover_args(cover, 2, 1)
+    return [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', video_path, '-i', audio_path, *cover_input,
+        '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', *cover_map,
+        *finalize_args(output_path, metadata)
+    ]
+
+# Source audio an output format holds as is: acodec prefixes, and source
+# extensions trusted when an extractor leaves acodec unknown
+COPYABLE_AUDIO = {
+    'm4a': (('mp4a', 'aac', 'alac'), ('m4a',)),
+    'mp3': (('mp3',), ('mp3',)),
+}
+
+def audio_copyable(fmt, codec):
+    """Whether a format's audio can go into an mp3/m4a file by stream copy"""
+    codecs, extensions = COPYABLE_AUDIO[codec]
+    acodec = (fmt.get('acodec') or '').lower()
+    if acodec and acodec != 'none':
+        return acodec.startswith(codecs)
+    return acodec != 'none' and fmt.get('ext') in extensions
+
+def remux_command(ffmpeg, source_path, output_path, metadata=None, cover=None):
+    """ffmpeg arguments to copy a file's video and audio into a new container"""
+    cover_input, cover_map = cover_args(cover, 1, 1)
+    return [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', source_path, *cover_input,
+        '-map', '0:v:0', '-map', '0:a?', '-c', 'copy', *cover_map,
+        *finalize_args(output_path, metadata)
+    ]
+
+def audio_command(ffmpeg, source_path, output_path, codec, copy=False, metadata=None, cover=None):
+    """ffmpeg arguments to convert a downloaded stream to an mp3/m4a audio file
+
+    With ``copy`` the audio is remuxed as is (see audio_copyable()).
+    """
+    if copy:
+        codec_args = ['-c:a', 'copy']
+    elif codec == 'mp3':
+        codec_args = ['-c:a', 'libmp3lame', '-q:a', '0']  # Best quality VBR
+    else:
+        codec_args = ['-c:a', 'aac', '-b:a', '192k']
+    cover_input, cover_map = cover_args(cover, 1, 0)
+    return [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', source_path, *cover_input,
+        '-map', '0:a:0', *codec_args, *cover_map,
+        *finalize_args(output_path, metadata)
+    ]
+
+class JobStopped(Exception):
+    """A job was cancelled or paused at one of its checkpoints"""
+
+class PostProcessPool:
+    """Runs ffmpeg merges and conversions off the download lane
+
+    Each task is a list of ffmpeg commands run as child processes; the pool
+    runs up to one per CPU core so encoding never holds up network transfers.
+    A command's last argument is its output: ffmpeg writes it under a .part
+    name on the same filesystem, renamed into place only once it succeeded,
+    so no half-written file ever carries the final name. Raw input files are
+    removed once a task succeeded or failed (with any unplaced intermediates,
+    as a failed job is never resumed). cancel() kills a task's running command
+    and skips the rest; the worker then keeps or removes its files.
+    """
+    def __init__(self, max_workers=None, metrics=None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.metrics = metrics
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.max_workers, thread_name_prefix="postprocess")
+        self._processes = {}
+        self._active = set()
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, commands, cleanup=(), stage='postprocess', placements=()):
+        """Queue a job's ffmpeg commands; returns a Future
+
+        ``placements`` are (path, destination) moves (see place_file()) made
+        once every command succeeded, e.g. from a scratch directory.
+        """
+        with self._lock:
+            self._active.add(job_id)
+            self._cancelled.discard(job_id)
+        return self.executor.submit(self._run, job_id, commands, list(cleanup), stage, list(placements))
+
+    def cancel(self, job_id):
+        """Stop a job's post-processing; its Future then fails with JobStopped
+
+        A no-op once the job's task has finished, so a late second call can't
+        fail the job's next task (e.g. after a pause and resume).
+        """
+        with self._lock:
+            if job_id not in self._active:
+                return
+            self._cancelled.add(job_id)
+            process = self._processes.get(job_id)
+        if process is not None:
+            process.kill()
+
+    def _run(self, job_id, commands, cleanup, stage, placements=()):
+        try:
+            with self._span(job_id, stage):
+                self._run_commands(job_id, commands)
+            if placements:
+                with self._span(job_id, 'place'):
+                    for path, destination in placements:
+                        place_file(path, destination)
+        except JobStopped:
+            raise  # A paused job resumes from its raw files
+        except Exception:
+            self._remove(cleanup + [path for path, _ in placements])
+            raise
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+                self._cancelled.discard(job_id)
+        self._remove(cleanup)
+
+    @staticmethod
+    def _remove(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _span(self, job_id, stage):
+        return self.metrics.span(job_id, stage) if self.metrics is not None else contextlib.nullcontext()
+
+    def _run_commands(self, job_id, commands):
+        for command in commands:
+            output_path = command[-1]
+            temp_path = f"{output_path}.{job_id[:8]}.part"  # Same-titled jobs may run at once
+            with self._lock:
+                if job_id in self._cancelled:
+                    raise JobStopped("Post-processing cancelled")
+                process = self._processes[job_id] = subprocess.Popen(
+                    command[:-1] + [temp_path], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE, text=True, creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+            try:
+                _, stderr = process.communicate()
+            finally:
+                with self._lock:
+                    self._processes.pop(job_id, None)
+                    cancelled = job_id in self._cancelled
+            if cancelled or process.returncode:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            if cancelled:
+                raise JobStopped("Post-processing cancelled")
+            if process.returncode:
+                output = (stderr or '').strip().splitlines()
+                raise RuntimeError(f"ffmpeg failed: {output[-1] if output else process.returncode}")
+            os.replace(temp_path, output_path)
+
+class DownloadScheduler:
+    """Priority queue of download jobs with per-host concurrency caps
+
+    Jobs are handed out lowest priority value first (FIFO within a level), but a
+    job is skipped while its host already has as many running jobs as its cap.
+    Finished jobs are forgotten ``keep_finished`` seconds after they finish, so
+    a long-running process (e.g. the daemon) doesn't grow without bound.
+    """
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 10
+    PRIORITY_LOW = 20
+    FINISHED = ('completed', 'failed', 'skipped', 'cancelled')
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, host_limits=None, default_host_limit=2, journal=None, keep_finished=24 * 3600):
+        self.host_limits = dict(host_limits or {})
+        self.default_host_limit = default_host_limit
+        self.journal = journal
+        self.keep_finished = keep_finished
+        self._pruned_at = time.monotonic()
+        self.jobs = {}
+        self._heap = []
+        self._running_per_host = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def submit(self, task, priority=PRIORITY_NORMAL, job_id=None, status='queued'):
+        """Queue a download task and return its job ID
+
+        A job submitted with another status (e.g. 'skipped') is only recorded;
+        a 'paused' one waits for requeue().
+        """
+        job_id = job_id or str(uuid.uuid4())
+        job = dict(task)
+        job.update({
+            'job_id': job_id,
+            'host': host_key(task['url']),
+            'priority': priority,
+            'status': status,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None if status in ('queued', 'paused') else time.time(),
+            'error': None,
+        })
+        with self._condition:
+            self._prune()
+            self.jobs[job_id] = job
+            if status == 'queued':
+                heapq.heappush(self._heap, (priority, next(self._counter), job_id))
+                self._condition.notify()
+        if self.journal:
+            self.journal.record(job)
+        return job_id
+
+    def get(self, timeout=None):
+        """Block until a job may start and mark it running; raises queue.Empty on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                job = self._pop_runnable()
+                if job is not None:
+                    job['status'] = 'running'
+                    job['started_at'] = time.time()
+                    self._running_per_host[job['host']] = self._running_per_host.get(job['host'], 0) + 1
+                    if self.journal:
+                        self.journal.update(job['job_id'], 'running')
+                    return dict(job)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._condition.wait(remaining)
+
+    def _prune(self):
+        """Forget jobs finished more than ``keep_finished`` seconds ago (lock held)"""
+        if time.monotonic() - self._pruned_at < self.PRUNE_INTERVAL:
+            return
+        self._pruned_at = time.monotonic()
+        cutoff = time.time() - self.keep_finished
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job['status'] in self.FINISHED and (job['finished_at'] or 0) < cutoff]:
+            del self.jobs[job_id]
+
+    def _pop_runnable(self):
+        """Pop the best queued job whose host is under its cap (lock held)"""
+        skipped = []
+        job = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            candidate = self.jobs.get(entry[2])
+            if candidate is None or candidate['status'] != 'queued':
+                continue
+            if self._running_per_host.get(candidate['host'], 0) >= self.host_limit(candidate['host']):
+                skipped.append(entry)
+                continue
+            job = candidate
+            break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return job
+
+    def finish(self, job_id, status, error=None, **fields):
+        """Record the outcome (or 'processing' stage) of a running job and free its host slot
+
+        ``fields`` (e.g. output, results) are stored on the job with it.
+        """
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            if job['status'] == 'running':
+                host = job['host']
+                self._running_per_host[host] = max(0, self._running_per_host.get(host, 0) - 1)
+            job.update(fields)
+            job['status'] = status
+            job['error'] = error
+            if status not in ('processing', 'paused'):
+                job['finished_at'] = time.time()
+            self._condition.notify_all()
+        if self.journal:
+            self.journal.update(job_id, status, error)
+
+    def withdraw(self, job_id, status):
+        """Take a queued or paused job out of line as ``status``; False if it already started"""
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] not in ('queued', 'paused'):
+                return False
+            job['status'] = status
+            if status != 'paused':
+                job['finished_at'] = time.time()
+        if self.journal:
+            self.journal.update(job_id, status)
+        return True
+
+    def requeue(self, job_id):
+        """Put a paused job back in line at its priority; False if it is not paused"""
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != 'paused':
+                return False
+            job['status'] = 'queued'
+            heapq.heappush(self._heap, (job['priority'], next(self._counter), job_id))
+            self._condition.notify()
+        if self.journal:
+            self.journal.update(job_id, 'queued')
+        return True
+
+    def host_limit(self, host):
+        """Maximum number of concurrent jobs for a host"""
+        return self.host_limits.get(host, self.default_host_limit)
+
+    def set_host_limit(self, host, limit):
+        """Change a host's concurrency cap at runtime"""
+        with self._condition:
+            self.host_limits[host] = limit
+            self._condition.notify_all()
+
+    def get_job(self, job_id):
+        """Return a snapshot of a job, or None if unknown"""
+        with self._condition:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, status=None):
+        """Return snapshots of all jobs, optionally filtered by status"""
+        with self._condition:
+            return [dict(job) for job in self.jobs.values() if status is None or job['status'] == status]
+
+def job_outputs(format_type, format_id, extra_outputs=None):
+    """A task's 'outputs' list, or None for a plain single-output job"""
+    if not extra_outputs:
+        return None
+    return [{'format_type': format_type, 'format_id': format_id}] + [
+        {'format_type': extra_type, 'format_id': extra_id} for extra_type, extra_id in extra_outputs]
+
 class DownloadWorker:
-    """Background worker for handling downloads"""
-    def __init__(self, gui_callback):
+    """Background worker for handling downloads
+
+    Metadata extraction and transfers run on separate lanes, each with its own
+    queue and thread count, so a "Fetch Details" never waits behind a download.
+    Downloads go through a DownloadScheduler, so up to ``download_workers`` jobs
+    run at once within the per-host caps. Post-processed outputs get tags and
+    the thumbnail as cover art in the same ffmpeg pass that merges/converts
+    them; a progressive mp4 that needs no pass is left as downloaded. cancel()/pause() stop a job at its
+    next checkpoint: a progress update, the start of a stream or ffmpeg run.
+    """
+    def __init__(self, gui_callback, metadata_workers=2, download_workers=3,
+                 metadata_queue_size=0, host_limits=None, default_host_limit=2,
+                 info_cache=None, progress_bus=None, quiet=False, fragment_tuner=None,
+                 journal=None, postprocessor=None, bandwidth=None, archive=None, metrics=None,
+                 embed_metadata=True, embed_thumbnail=True, scratch_dir=None, verbose=False):
         self.gui_callback = gui_callback
-        self.task_queue = queue.Queue()
+        self.archive = archive
+        # Raw streams, fragments and intermediates go here (e.g. a local SSD)
+        # when set; only finished outputs are moved to the download path
+        self.scratch_dir = scratch_dir
+        if scratch_dir:
+            os.makedirs(scratch_dir, exist_ok=True)
+        self._reservations = {}
+        self._space_lock = threading.Lock()
+        # Tags and cover art ride along with the ffmpeg pass a job needs anyway
+        self.embed_metadata = embed_metadata
+        self.embed_thumbnail = embed_thumbnail
+        self.metrics = metrics or JobMetrics()
+        self.bandwidth = bandwidth or BandwidthLimiter()
+        self.postprocessor = postprocessor or PostProcessPool(metrics=self.metrics)
+        self.fragment_tuner = fragment_tuner or FragmentTuner()
+        self.quiet = quiet
+        # yt-dlp's [debug] output (--debug), written to stderr
+        self.verbose = verbose
+        self.info_cache = info_cache or InfoCache()
+        self.extractions = SingleFlight()
+        self.details_requests = SingleFlight()
+        self._thread_state = threading.local()
+        self._controls = {}
+        self._controls_lock = threading.Lock()
+        self.progress_bus = progress_bus or ProgressBus()
+        self.progress_bus.subscribe(self._publish_progress)
+        self.metadata_queue = queue.Queue(maxsize=metadata_queue_size)
+        self.scheduler = DownloadScheduler(host_limits, default_host_limit, journal)
         self.active_downloads = {}
-        self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
-        self.worker_thread.start()
+        self.worker_threads = []
+        self._start_lane('metadata', self._worker_loop, (self.metadata_queue,), metadata_workers)
+        self._start_lane('download', self._download_loop, (), download_workers)
     
-    def _worker_loop(self):
-        """Main worker loop"""
+    def _start_lane(self, name, target, args, size):
+        """Start the daemon threads serving one lane"""
+        for index in range(max(1, size)):
+            thread = threading.Thread(
+                target=target,
+                args=args,
+                name=f"{name}-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self.worker_threads.append(thread)
+    
+    def _worker_loop(self, task_queue):
+        """Main worker loop for a single lane"""
         while True:
             try:
-                task = self.task_queue.get(timeout=1)
-                if task['action'] == 'fetch_details':
-                    self._fetch_video_details(task)
-                elif task['action'] == 'download':
-                    self._download_video(task)
-                self.task_queue.task_done()
+                task = task_queue.get(timeout=1)
             except queue.Empty:
                 continue
+            try:
+                if task['action'] == 'fetch_details':
+                    self._run_details_request(task)
+                elif task['action'] == 'expand_playlist':
+                    self._expand_playlist(task)
             except Exception as e:
                 print(f"Worker error: {e}")
+                self.metrics.increment('worker_errors', action=task['action'])
+            finally:
+                task_queue.task_done()
     
-    def _fetch_video_details(self, task):
-        """Fetch video details in background"""
+    def _download_loop(self):
+        """Download lane loop: run scheduled jobs and record their outcome"""
+        while True:
+            try:
+                job = self.scheduler.get(timeout=1)
+            except queue.Empty:
+                continue
+            self.metrics.start(job['job_id'], url=job['url'], host=job['host'],
+                               format_type=job['format_type'], submitted_at=job['submitted_at'])
+            self.metrics.add_span(job['job_id'], 'queue', job['started_at'] - job['submitted_at'])
+            try:
+                postprocessing = self._download_video(job)
+            except Exception as e:
+                self._finish_job(job, e)
+                continue
+            if postprocessing is None:
+                self._finish_job(job)
+            else:
+                # The transfer is done; free the host slot while ffmpeg runs
+                self.scheduler.finish(job['job_id'], 'processing')
+                if self._control(job['job_id'])['state']:
+                    self.postprocessor.cancel(job['job_id'])  # Stopped while being handed over
+                postprocessing.add_done_callback(lambda future, job=job: self._finish_job(job, future.exception()))
+    
+    def _finish_job(self, job, error=None):
+        """Record a job's final outcome and notify the GUI"""
+        self.progress_bus.discard(job['job_id'])
+        self._release_space(job['job_id'])
+        control = self._control(job['job_id'])
+        if error is not None and control['state']:
+            self._stop_job(job, control)
+            return
+        with self._controls_lock:
+            self._controls.pop(job['job_id'], None)
+        if error is None and self.archive:
+            for result in job.get('results', ()):
+                try:
+                    result['path'] = self.archive.record(
+                        job['url'], result['format_type'], job.get('archive_format') or result['format_id'],
+                        result['path'])
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Error archiving download: {e}")
+            if job.get('results'):
+                job['output'] = job['results'][0]['path']
+        self.metrics.finish(job['job_id'], 'completed' if error is None else 'failed',
+                            None if error is None else str(error))
+        if error is None:
+            self.scheduler.finish(job['job_id'], 'completed', output=job.get('output'), results=job.get('results'))
+            self.gui_callback('download_complete', {
+                'job_id': job['job_id'], 'title': job.get('title', 'Video'), 'path': job.get('output'),
+                'paths': [result['path'] for result in job.get('results', ())]})
+        else:
+            self.scheduler.finish(job['job_id'], 'failed', str(error))
+            self.gui_callback('download_error', {'job_id': job['job_id'], 'error': str(error)})
+    
+    def _control(self, job_id):
+        """A started job's stop request, shared between its threads and cancel()/pause()"""
+        with self._controls_lock:
+            return self._controls.setdefault(job_id, {'state': None, 'keep_partial': False, 'files': set()})
+    
+    def _checkpoint(self, control):
+        """Raise JobStopped if the job was asked to stop"""
+        if control['state']:
+            raise JobStopped("Download cancelled" if control['state'] == 'cancel' else "Download paused")
+    
+    def _stop_job(self, job, control):
+        """Record a job that stopped on request; paused jobs keep their control for resume()"""
+        job_id = job['job_id']
+        title = job.get('title', 'Video')
+        if control['state'] == 'pause':
+            control['state'] = None
+            self.metrics.finish(job_id, 'paused')
+            self.scheduler.finish(job_id, 'paused')
+            self.gui_callback('download_paused', {'job_id': job_id, 'title': title})
+            return
+        with self._controls_lock:
+            self._controls.pop(job_id, None)
+        if not control['keep_partial']:
+            self._remove_partial_files(job, control['files'])
+        self.metrics.finish(job_id, 'cancelled')
+        self.scheduler.finish(job_id, 'cancelled')
+        self.gui_callback('download_cancelled', {'job_id': job_id, 'title': title})
+    
+    def _remove_partial_files(self, job, files):
+        """Delete a job's .part/.ytdl files, fragments and raw streams
+        
+        ``files`` are the names its progress hooks reported; raw streams are
+        also found by the job ID in their names, e.g. after a restart.
+        """
+        work_dir = glob.escape(self._work_dir(job))
+        paths = set(glob.glob(os.path.join(work_dir, f"*.{job['job_id'][:8]}.f*")))
+        if self.scratch_dir:
+            paths.update(glob.glob(os.path.join(work_dir, f"{job['job_id'][:8]}.*")))  # Intermediates
+        for filename in files:
+            paths.update(glob.glob(glob.escape(filename) + '.part*'))
+            paths.add(filename + '.ytdl')
+            if RAW_STREAM_NAME.search(filename):
+                paths.add(filename)
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def _publish_progress(self, states):
+        """Forward a coalesced progress batch to the GUI callback"""
+        for state in states:
+            if state['progress'] is not None:
+                self.gui_callback('download_progress', state)
+    
+    def _run_details_request(self, task):
+        """Settle a fetch_many() Future, sharing one fetch between URLs of the same video
+
+        The key is computed here rather than by the caller: the first
+        canonical_key() imports yt-dlp and compiles its extractor patterns,
+        which would freeze the GUI.
+        """
+        requested = task['future']
         try:
-            url = task['url']
-            ydl_opts = {
-                'quiet': True,
-                'simulate': True,
-                'force_generic_extractor': True,
-                'dump_single_json': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info_dict = ydl.extract_info(url, download=False)
-            
-            # Extract relevant information
-            video_info = {
-                'title': info_dict.get('title', 'N/A'),
-                'thumbnail': info_dict.get('thumbnail'),
-                'duration': info_dict.get('duration'),
-                'uploader': info_dict.get('uploader'),
-                'formats': self._extract_formats(info_dict.get('formats', []))
+            key = canonical_key(task['url'])
+        except Exception as e:
+            requested.set_exception(e)
+            return
+
+        def relay(shared):
+            if shared.exception() is not None:
+                requested.set_exception(shared.exception())
+            else:
+                requested.set_result(shared.result())
+
+        shared, owner = self.details_requests.claim(key)
+        shared.add_done_callback(relay)
+        if not owner:
+            return
+        try:
+            with self.metrics.span(None, 'details'):
+                details = self._fetch_video_details(task)
+            self.details_requests.settle(key, details)
+        except Exception as e:
+            self.details_requests.settle(key, error=e)
+
+    def _fetch_video_details(self, task):
+        """Fetch video details in background; returns the details shown to the user"""
+        info_dict = self._extract(task['url'])
+        if info_dict.get('_type') in ('playlist', 'multi_video'):
+            return {
+                'is_playlist': True,
+                'title': info_dict.get('title') or 'Playlist',
+                'thumbnail': None,
+                'duration': None,
+                'uploader': info_dict.get('uploader') or info_dict.get('channel'),
+                'entry_count': info_dict.get('playlist_count'),
+                'formats': self._playlist_formats()
             }
-            
-            self.gui_callback('video_details_success', video_info)
-            
+        
+        # Extract relevant information
+        return {
+            'title': info_dict.get('title', 'N/A'),
+            'thumbnail': info_dict.get('thumbnail'),
+            'duration': info_dict.get('duration'),
+            'uploader': info_dict.get('uploader'),
+            # Without a formats list yt-dlp treats the info dict as the only format
+            'formats': self._extract_formats(info_dict.get('formats') or [info_dict])
+        }
+    
+    def _report_details(self, url, future):
+        """Send the outcome of a details request to the GUI callback"""
+        error = future.exception()
+        self.metrics.increment('details_requests', status='failed' if error else 'ok')
+        if error is not None:
+            self.gui_callback('video_details_error', {'url': url, 'error': str(error)})
+            return
+        details = dict(future.result(), url=url)
+        self.gui_callback('playlist_details_success' if details.get('is_playlist') else 'video_details_success', details)
+    
+    def _extract(self, url):
+        """Cached or freshly extracted info dict for a URL, one extraction per video at a time
+
+        Playlists come back unprocessed (and uncached) so their entries are not
+        resolved here.
+        """
+        info_dict = self.info_cache.get(url)
+        if info_dict is not None:
+            return info_dict
+        
+        def extract():
+            info_dict = self.info_cache.get(url)
+            if info_dict is not None:
+                return info_dict
+            ydl = self._extractor_ydl()
+            # Unprocessed first: a playlist must not have its entries resolved here
+            info_dict = ydl.extract_info(url, download=False, process=False)
+            if info_dict.get('_type') in ('playlist', 'multi_video'):
+                return info_dict
+            info_dict = ydl.process_ie_result(info_dict, download=False)
+            return self.info_cache.put(url, info_dict)
+        
+        return self.extractions.run(canonical_key(url), extract)
+    
+    def _playlist_formats(self):
+        """Quality options for a playlist: every standard level, resolved per entry"""
+        return self._extract_formats([
+            {'format_id': str(height), 'vcodec': 'video', 'height': height}
+            for height in (240, 360, 480, 720, 1080, 1440, 2160, 4320)
+        ], resolve=False)
+    
+    def _expand_playlist(self, task):
+        """Stream playlist/channel entries into the download scheduler as pages arrive"""
+        playlist_id = task['playlist_id']
+        queued = 0
+        try:
+            for entry in iter_playlist_entries(task['url']):
+                job_id = str(uuid.uuid4())
+                self.gui_callback('playlist_entry_queued', {
+                    'playlist_id': playlist_id,
+                    'job_id': job_id,
+                    'url': entry['url'],
+                    'title': entry['title'],
+                    'index': queued
+                })
+                self._submit_download({
+                    'action': 'download',
+                    'url': entry['url'],
+                    'format_type': task['format_type'],
+                    'format_id': task['format_id'],
+                    'download_path': task['download_path'],
+                    'title': entry['title'],
+                    'playlist_id': playlist_id,
+                    'archive_format': task.get('archive_format'),
+                    'outputs': task.get('outputs')
+                }, priority=task['priority'], job_id=job_id)
+                queued += 1
+            self.gui_callback('playlist_expanded', {'playlist_id': playlist_id, 'url': task['url'], 'count': queued})
         except Exception as e:
-            self.gui_callback('video_details_error', str(e))
+            self.gui_callback('playlist_error', {
+                'playlist_id': playlist_id, 'url': task['url'], 'count': queued, 'error': str(e)})
     
-    def _extract_formats(self, formats):
-        """Extract and organize available formats with simplified quality options"""
+    def _extract_formats(self, formats, resolve=True):
+        """Extract and organize available formats with simplified quality options
+
+        With ``resolve`` every mp4 option is resolved against ``formats`` up
+        front; options that match nothing are dropped and the rest record the
+        exact format IDs they will download.
+        """
         organized_formats = {
             'mp4': [],
             'audio': []
@@ -158,6 +1915,17 @@ class DownloadWorker:
                 # Remove this height from available_heights to avoid duplicates
                 available_heights = {h for h in available_heights if h > standard_height}
         
+        if resolve:
+            resolved_options = []
+            ordered = sort_formats(formats, MP4_FORMAT_SORT)
+            for option in organized_formats['mp4']:
+                selected = resolve_format(ordered, option['format_id'], MP4_FORMAT_SORT, presorted=True)
+                if selected:
+                    option['resolved_format_ids'] = '+'.join(f['format_id'] for f in selected)
+                    resolved_options.append(option)
+            # Never leave mp4 without a choice: keep "Best" for the download to resolve
+            organized_formats['mp4'] = resolved_options or organized_formats['mp4'][:1]
+        
         # Add unique audio formats
         seen_bitrates = set()
         for audio_fmt in sorted(audio_formats, key=lambda x: x['abr'], reverse=True):
@@ -167,146 +1935,647 @@ class DownloadWorker:
         
         return organized_formats
     
-    def _download_video(self, task):
-        """Download video in background"""
-        download_id = str(uuid.uuid4())
-        
+    def _download_video(self, task):
+        """Download video in background; raises on failure
+        
+        Every stream is fetched once per job, however many of its outputs
+        (see start_download's ``extra_outputs``) are made from it.
+        """
+        job_id = task['job_id']
+        
+        url = task['url']
+        outputs = task.get('outputs') or [{'format_type': task['format_type'], 'format_id': task['format_id']}]
+        download_path = task['download_path']
+        work_dir = self._work_dir(task)
+        host = host_key(url)
+        stream = {'started': None, 'fragmented': False, 'bytes': None, 'kind': None}
+        control = self._control(job_id)
+        
+        def progress_hook(d):
+            if d.get('filename'):
+                control['files'].add(d['filename'])
+            if control['state']:
+                # yt-dlp's own stop signal, so fragment threads wind down too
+                raise yt_dlp.utils.DownloadCancelled("Download cancelled" if control['state'] == 'cancel'
+                                                     else "Download paused")
+            if d['status'] == 'downloading':
+                if stream['started'] is None:
+                    stream['started'] = time.monotonic()
+                if d.get('fragment_count'):
+                    stream['fragmented'] = True
+                total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+                downloaded_bytes = d.get('downloaded_bytes')
+                if downloaded_bytes is not None:
+                    # Charge the bytes since the last hook to the shared
+                    # budget; the first call only sets the baseline, as it
+                    # includes whatever a resumed .part already held
+                    if stream['bytes'] is not None and downloaded_bytes > stream['bytes']:
+                        self.bandwidth.consume(job_id, downloaded_bytes - stream['bytes'])
+                    stream['bytes'] = downloaded_bytes
+                    self.progress_bus.update(job_id, downloaded_bytes, total_bytes)
+            elif d['status'] == 'finished':
+                self.metrics.count(job_id, 'bytes', d.get('total_bytes') or d.get('downloaded_bytes') or 0)
+                if stream['fragmented']:
+                    # Tune fragment concurrency for later streams of this kind
+                    elapsed = d.get('elapsed') or time.monotonic() - stream['started']
+                    size = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+                    self.fragment_tuner.report(host, ydl_opts['concurrent_fragment_downloads'],
+                                               size / elapsed if elapsed else 0, stream=stream['kind'])
+                stream.update(started=None, fragmented=False, bytes=None)
+                self.gui_callback('download_processing', {'job_id': job_id, 'message': None})
+        
+        # Configure download options without current date; streams are fetched
+        # one format at a time and post-processed by the PostProcessPool. Raw
+        # names carry the job ID so identical jobs never share .part files.
+        raw_template = os.path.join(work_dir, f"%(title)s.{job_id[:8]}.f%(format_id)s.%(ext)s")
+        ydl_opts = {
+            'outtmpl': raw_template,
+            'progress_hooks': [progress_hook],
+            'postprocessors': [],
+            'noplaylist': True,
+            'no_warnings': False,
+            'extractaudio': False,
+            'audioformat': 'best',
+            'embed_subs': False,
+            'writesubtitles': False,
+            'writeautomaticsub': False,
+            'allsubtitles': False,
+            'ignoreerrors': False,
+            'no_overwrites': False,
+            'continuedl': True,
+            'noprogress': self.quiet,
+            'quiet': self.quiet,
+            'verbose': self.verbose,
+            'consoletitle': False,
+            'nopart': False,
+            'updatetime': False,  # Don't update file modification time to video upload date
+            'http_chunk_size': HTTP_CHUNK_SIZE,
+            'concurrent_fragment_downloads': 0,  # Reserved per stream below
+        }
+        
+        # Set ffmpeg path (local first, then system PATH), probed once per process
+        ffmpeg = probe_ffmpeg()
+        if ffmpeg:
+            ydl_opts['ffmpeg_location'] = ffmpeg['location']
+        
+        try:
+            # Resolve the exact formats locally against the extraction from
+            # "Fetch Details" (when its stream URLs are still valid), falling
+            # back to a generic mp4 selector before anything is downloaded
+            with self.metrics.span(job_id, 'extract'):
+                info_dict = self._get_info(url)
+            with self.metrics.span(job_id, 'resolve'):
+                plans = self._plan_outputs(job_id, info_dict, outputs)
+            
+            # A single progressive file needs no post-processing; it is still
+            # fetched under its job-scoped raw name and then moved into place
+            progressive = len(plans) == 1 and plans[0][0]['format_type'] == "mp4" and len(plans[0][1]) == 1
+            if not progressive and not ffmpeg:
+                raise RuntimeError("ffmpeg not found. It is required to merge or convert this download.")
+            # Fail before the transfer, not after it, when an encode can't run
+            for output, selected in plans:
+                encoder = {'mp3': 'libmp3lame', 'm4a': 'aac'}.get(output['format_type'])
+                if encoder and not audio_copyable(selected[0], output['format_type']) \
+                        and not ffmpeg_supports('encoders', encoder):
+                    raise RuntimeError(f"This ffmpeg has no {encoder} encoder, needed for {output['format_type']} output.")
+            self._reserve_space(job_id, plans, info_dict, work_dir, download_path, progressive)
+            
+            downloads = {}
+            for _, selected in plans:
+                for fmt in selected:
+                    if fmt['format_id'] in downloads:
+                        continue
+                    self._checkpoint(control)
+                    stream['kind'] = 'audio' if fmt.get('vcodec') == 'none' else 'video'
+                    self.fragment_tuner.release(ydl_opts['concurrent_fragment_downloads'])
+                    ydl_opts['concurrent_fragment_downloads'] = self.fragment_tuner.acquire(host, stream['kind'])
+                    with self.metrics.span(job_id, 'transfer'):
+                        filepath, info_dict = self._download_format(ydl_opts, url, info_dict, fmt['format_id'], job_id)
+                    downloads[fmt['format_id']] = filepath
+        except Exception:
+            if stream['fragmented'] and not control['state']:
+                self.fragment_tuner.report(host, ydl_opts['concurrent_fragment_downloads'], 0, errors=1,
+                                           stream=stream['kind'])
+            raise
+        finally:
+            self.fragment_tuner.release(ydl_opts['concurrent_fragment_downloads'])
+            self.bandwidth.release(job_id)
+        
+        if progressive:
+            output, _ = plans[0]
+            path = next(iter(downloads.values()))
+            # The raw name already holds the sanitized title: "<title>.<job>.f<id>.<ext>"
+            raw_name = os.path.basename(path)
+            marker = raw_name.rfind(f".{job_id[:8]}.f")
+            name = raw_name[:marker] if marker > 0 else self._output_name(ydl_opts, info_dict)
+            destination = os.path.join(download_path, name + os.path.splitext(path)[1])
+            with self.metrics.span(job_id, 'place'):
+                place_file(path, destination)
+            path = destination
+            task['results'] = [dict(output, path=path)]
+            task['output'] = path
+            return None
+        
+        # Hand the raw streams to the post-processing pool and free this lane
+        self._checkpoint(control)
+        name = self._output_name(ydl_opts, info_dict)
+        output_stem = os.path.join(download_path, name)
+        metadata = self._output_metadata(info_dict) if self.embed_metadata else None
+        cover = self._fetch_cover(info_dict, os.path.join(work_dir, name), job_id) if self.embed_thumbnail else None
+        cleanup = list(downloads.values()) + ([cover] if cover else [])
+        commands, stages, results, placements = [], [], [], []
+        for output, selected in plans:
+            format_type = output['format_type']
+            sources = [downloads[fmt['format_id']] for fmt in selected]
+            path = output_stem + '.' + format_type
+            if any(result['path'] == path for result in results):
+                # A second output of the same type, e.g. another quality
+                path = f"{output_stem} ({'+'.join(fmt['format_id'] for fmt in selected)}).{format_type}"
+            target = path
+            if self.scratch_dir:
+                target = os.path.join(work_dir, f"{job_id[:8]}.{os.path.basename(path)}")
+                placements.append((target, path))
+            if format_type == "mp4" and len(sources) == 2:
+                commands.append(merge_command(ffmpeg['ffmpeg'], sources[0], sources[1], target, metadata, cover))
+                stages.append('merge')
+            elif format_type == "mp4":
+                commands.append(remux_command(ffmpeg['ffmpeg'], sources[0], target, metadata, cover))
+                stages.append('remux')
+            else:
+                # Remux when the source already has the target codec (e.g. AAC
+                # for m4a); only a real codec change pays for a re-encode
+                copy = audio_copyable(selected[0], format_type)
+                commands.append(audio_command(ffmpeg['ffmpeg'], sources[0], target, format_type, copy=copy,
+                                              metadata=metadata, cover=cover))
+                stages.append('remux' if copy else 'postprocess')
+            results.append(dict(output, path=path))
+        task['results'] = results
+        task['output'] = results[0]['path']
+        return self.postprocessor.submit(job_id, commands, cleanup=cleanup,
+                                         stage=stages[0] if len(stages) == 1 else 'postprocess',
+                                         placements=placements)
+    
+    def _work_dir(self, task):
+        """Where a job's raw streams and intermediates are written"""
+        return self.scratch_dir or task['download_path']
+    
+    def _reserve_space(self, job_id, plans, info_dict, work_dir, download_path, progressive):
+        """Admit a job only if its estimated files fit on disk; raises RuntimeError otherwise
+        
+        Raw streams and intermediates count against the work directory and
+        outputs moved off it against the download path. Running jobs hold
+        their full estimate until they finish, so admission errs on the safe side.
+        A resumed job's raw and .part files already on disk count as written.
+        """
+        duration = info_dict.get('duration')
+        sizes = {fmt['format_id']: estimate_size(fmt, duration) for _, selected in plans for fmt in selected}
+        outputs = sum(sum(sizes[fmt['format_id']] for fmt in selected) for _, selected in plans)
+        written = 0
+        for path in glob.glob(os.path.join(glob.escape(work_dir), f"*.{job_id[:8]}.f*")):
+            try:
+                written += os.path.getsize(path)
+            except OSError:
+                pass
+        work_path = existing_parent(work_dir)
+        paths = {os.stat(work_path).st_dev: work_path}
+        reservation = {os.stat(work_path).st_dev: max(0, sum(sizes.values()) - written) + (0 if progressive else outputs)}
+        if self.scratch_dir:
+            download_parent = existing_parent(download_path)
+            device = os.stat(download_parent).st_dev
+            if device not in reservation:  # Otherwise placing is a rename
+                paths[device] = download_parent
+                reservation[device] = outputs
+        with self._space_lock:
+            for device, size in reservation.items():
+                reserved = sum(other.get(device, 0) for other in self._reservations.values())
+                free = shutil.disk_usage(paths[device]).free - reserved
+                if size > free:
+                    raise RuntimeError(f"Not enough disk space in {paths[device]}: about {size / 1e6:.0f} MB "
+                                       f"needed, {max(free, 0) / 1e6:.0f} MB free")
+            self._reservations[job_id] = reservation
+    
+    def _release_space(self, job_id):
+        with self._space_lock:
+            self._reservations.pop(job_id, None)
+    
+    def _output_metadata(self, info_dict):
+        """Tags written into a job's outputs"""
+        upload_date = info_dict.get('upload_date')
+        return {
+            'title': info_dict.get('title'),
+            'artist': info_dict.get('uploader') or info_dict.get('channel'),
+            'date': f"{upload_date[:4]}-{upload_date[4:6]}-{upload_date[6:]}" if upload_date else None,
+            'comment': info_dict.get('webpage_url'),
+        }
+    
+    def _fetch_cover(self, info_dict, output_stem, job_id):
+        """Download a video's thumbnail next to its raw streams; None if it has none or the fetch failed"""
+        url = info_dict.get('thumbnail')
+        if not url:
+            return None
+        ext = os.path.splitext(urlparse(url).path)[1].lower()
+        path = f"{output_stem}.{job_id[:8]}.fthumb{ext if ext in ('.jpg', '.jpeg', '.png', '.webp') else '.jpg'}"
         try:
-            url = task['url']
-            format_type = task['format_type']
-            format_id = task['format_id']
-            download_path = task['download_path']
-            
-            def progress_hook(d):
-                if d['status'] == 'downloading':
-                    total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-                    downloaded_bytes = d.get('downloaded_bytes')
-                    if total_bytes and downloaded_bytes:
-                        progress = downloaded_bytes / total_bytes
-                        self.gui_callback('download_progress', {
-                            'progress': progress,
-                            'percent': d.get('_percent_str', ''),
-                            'speed': d.get('_speed_str', ''),
-                            'eta': d.get('_eta_str', '')
-                        })
-                elif d['status'] == 'finished':
-                    self.gui_callback('download_processing', None)
-                elif d['status'] == 'error':
-                    self.gui_callback('download_error', d.get('error', 'Unknown error'))
-            
-            # Configure download options without current date
-            output_template = os.path.join(download_path, '%(title)s.%(ext)s')
-            ydl_opts = {
-                'outtmpl': output_template,
-                'progress_hooks': [progress_hook],
-                'postprocessors': [],
-                'noplaylist': True,
-                'no_warnings': False,
-                'extractaudio': False,
-                'audioformat': 'best',
-                'embed_subs': False,
-                'writesubtitles': False,
-                'writeautomaticsub': False,
-                'allsubtitles': False,
-                'ignoreerrors': False,
-                'no_overwrites': False,
-                'continuedl': True,
-                'noprogress': False,
-                'consoletitle': False,
-                'nopart': False,
-                'updatetime': False,  # Don't update file modification time to video upload date
-            }
-            
-            # Set ffmpeg path (local first, then system PATH)
-            ffmpeg_paths = [
-                resource_path(os.path.join("ffmpeg", "bin", "ffmpeg.exe")),  # Local ffmpeg (PyInstaller compatible)
-                "ffmpeg"  # System PATH
-            ]
-            
-            for ffmpeg_path in ffmpeg_paths:
-                try:
-                    subprocess.run([ffmpeg_path, "-version"], check=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                    ydl_opts['ffmpeg_location'] = os.path.dirname(ffmpeg_path) if ffmpeg_path.endswith('.exe') else None
-                    break
-                except (subprocess.CalledProcessError, FileNotFoundError):
-                    continue
-            
+            data = self._extractor_ydl().urlopen(url).read()
+            with open(path, 'wb') as f:
+                f.write(data)
+        except (yt_dlp.utils.YoutubeDLError, OSError) as e:
+            print(f"Error fetching thumbnail: {e}")
+            return None
+        return path
+    
+    def _plan_outputs(self, job_id, info_dict, outputs):
+        """[(output, [format, ...]), ...]: the streams each output is made from
+        
+        mp3 is always re-encoded, so next to other outputs it reuses the best
+        audio stream they fetch anyway instead of adding a transfer.
+        """
+        plans = []
+        for output in outputs:
+            format_type = output['format_type']
             if format_type == "mp4":
                 # Use the format specification as is (already includes audio merging logic)
-                ydl_opts['format'] = format_id
-                ydl_opts['merge_output_format'] = 'mp4'
+                format_spec = output['format_id']
                 # Ensure we always try to get the best available format with fallbacks
-                ydl_opts['format_sort'] = ['res', 'ext:mp4:m4a']
-                
+                format_sort = MP4_FORMAT_SORT
             elif format_type == "m4a":
                 # For M4A, extract audio from the selected format
-                ydl_opts['format'] = format_id
-                ydl_opts['postprocessors'].append({
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'm4a',
-                })
-                output_template = os.path.join(download_path, '%(title)s.m4a')
-                ydl_opts['outtmpl'] = output_template
-                
-            elif format_type == "mp3":
+                format_spec = output['format_id']
+                format_sort = ()
+            else:
+                plans.append((output, None))
+                continue
+            selected = self._select_formats(info_dict, format_spec, format_sort)
+            if selected is None and format_type == "mp4":
+                self.gui_callback('download_processing', {'job_id': job_id, 'message': "Quality not available, using best available format..."})
+                selected = self._select_formats(info_dict, FALLBACK_MP4_FORMAT, format_sort)
+            if selected is None:
+                raise yt_dlp.utils.DownloadError("Requested format is not available")
+            plans.append((output, selected))
+        
+        fetched = [fmt for _, selected in plans if selected for fmt in selected
+                   if fmt.get('acodec') and fmt['acodec'] != 'none']
+        for index, (output, selected) in enumerate(plans):
+            if selected is not None:
+                continue
+            if fetched:
+                selected = [max(fetched, key=lambda fmt: fmt.get('abr') or fmt.get('tbr') or 0)]
+            else:
                 # For MP3, always use best audio quality
-                ydl_opts['format'] = "bestaudio/best"
-                ydl_opts['postprocessors'].append({
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '0',  # Use best quality (VBR)
-                    'nopostoverwrites': False,  # Allow overwriting
-                })
-                # Don't specify .mp3 extension in template - let the postprocessor handle it
-                output_template = os.path.join(download_path, '%(title)s.%(ext)s')
-                ydl_opts['outtmpl'] = output_template
-            
-            # Perform download with fallback handling
+                selected = self._select_formats(info_dict, "bestaudio/best")
+            if selected is None:
+                raise yt_dlp.utils.DownloadError("Requested format is not available")
+            plans[index] = (output, selected)
+        return plans
+
+    def _extractor_ydl(self):
+        """This thread's YoutubeDL for extraction
+
+        Building one loads every extractor class and a TLS context (~0.1s of
+        CPU), which would otherwise be repeated for every URL of a batch.
+        """
+        ydl = getattr(self._thread_state, 'ydl', None)
+        if ydl is None:
+            ydl = self._thread_state.ydl = yt_dlp.YoutubeDL({
+                'quiet': True,
+                'verbose': self.verbose,
+                'simulate': True,
+                'dump_single_json': True,
+                'noplaylist': True,
+                'extract_flat': 'in_playlist',
+                'lazy_playlist': True,
+            })
+        return ydl
+
+    def _get_info(self, url):
+        """Cached info dict for a URL, extracting (and caching) it if needed"""
+        info_dict = self._extract(url)
+        if info_dict.get('_type') in ('playlist', 'multi_video'):
+            raise yt_dlp.utils.DownloadError("URL is a playlist; queue it with start_playlist_download")
+        return info_dict
+
+    def _select_formats(self, info_dict, format_spec, format_sort=()):
+        """Resolve a format selector to [format, ...] (None if nothing matches) without downloading"""
+        return resolve_format(info_dict.get('formats') or [info_dict], format_spec, format_sort)
+
+    def _download_format(self, ydl_opts, url, info_dict, format_id, job_id=None):
+        """Download one format from an info dict; returns (filepath, info_dict)
+
+        A 403 on a cached info dict means its stream URLs went stale early, so
+        the entry is dropped and the URL extracted once more.
+        """
+        ydl_opts['format'] = format_id
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-                self.gui_callback('download_complete', task.get('title', 'Video'))
-            except Exception as download_error:
-                # If the specific format fails, try with a more generic fallback
-                if format_type == "mp4" and "Requested format is not available" in str(download_error):
-                    self.gui_callback('download_processing', "Trying fallback format...")
-                    
-                    # Fallback to best available format
-                    fallback_opts = ydl_opts.copy()
-                    fallback_opts['format'] = 'best[ext=mp4]/bestvideo[ext=mp4]+bestaudio[ext=m4a]/best'
-                    
-                    try:
-                        with yt_dlp.YoutubeDL(fallback_opts) as ydl:
-                            ydl.download([url])
-                        self.gui_callback('download_complete', task.get('title', 'Video'))
-                    except Exception as fallback_error:
-                        raise download_error  # Raise original error
-                else:
-                    raise download_error
-            
-        except Exception as e:
-            self.gui_callback('download_error', str(e))
-    
+                result = ydl.process_ie_result(copy.deepcopy(info_dict), download=True)
+            except yt_dlp.utils.DownloadError as e:
+                if 'HTTP Error 403' not in str(e):
+                    raise
+                self.metrics.count(job_id, 'retries')
+                self.info_cache.invalidate(url)
+                info_dict = self._get_info(url)
+                result = ydl.process_ie_result(copy.deepcopy(info_dict), download=True)
+        return result['requested_downloads'][0]['filepath'], info_dict
+
+    def _output_name(self, ydl_opts, info_dict):
+        """Sanitized file name (without extension) for a job's final output"""
+        with yt_dlp.YoutubeDL(dict(ydl_opts, progress_hooks=[])) as ydl:
+            return os.path.basename(ydl.prepare_filename(info_dict, outtmpl='%(title)s'))
+
     def fetch_video_details(self, url):
-        """Queue video details fetch task"""
-        self.task_queue.put({
-            'action': 'fetch_details',
-            'url': url
-        })
+        """Queue video details fetch task; returns a Future of the details"""
+        return self.fetch_many([url])[0]
     
-    def start_download(self, url, format_type, format_id, download_path, title):
-        """Queue download task"""
-        self.task_queue.put({
+    def fetch_many(self, urls):
+        """Queue details fetches for many URLs; returns one Future per URL
+
+        They run ``metadata_workers`` at a time. URLs for the same video share
+        a single extraction; each URL still gets its own callback.
+        """
+        futures = []
+        for url in urls:
+            future = concurrent.futures.Future()
+            future.add_done_callback(lambda future, url=url: self._report_details(url, future))
+            self.metadata_queue.put({
+                'action': 'fetch_details',
+                'url': url,
+                'future': future
+            })
+            futures.append(future)
+        return futures
+    
+    def start_download(self, url, format_type, format_id, download_path, title,
+                       priority=DownloadScheduler.PRIORITY_NORMAL, archive_format=None, extra_outputs=None,
+                       job_id=None):
+        """Queue download task and return its job ID
+
+        ``archive_format`` names the format in the download archive instead
+        of ``format_id`` (e.g. a quality rule that picks different IDs per video).
+        ``extra_outputs`` are more (format_type, format_id) pairs made from
+        the same transfer, e.g. ``[('mp3', None)]`` next to an mp4. A caller
+        may pick ``job_id`` itself, to know it before any event is sent.
+        """
+        return self._submit_download({
             'action': 'download',
             'url': url,
             'format_type': format_type,
             'format_id': format_id,
             'download_path': download_path,
-            'title': title
+            'title': title,
+            'archive_format': archive_format,
+            'outputs': job_outputs(format_type, format_id, extra_outputs)
+        }, priority=priority, job_id=job_id)
+    
+    def archived_path(self, url, format_type, format_spec):
+        """Where an earlier download of this video and format lives, or None"""
+        return self.archive.lookup(url, format_type, format_spec) if self.archive else None
+    
+    def _submit_download(self, task, priority, job_id=None):
+        """Schedule a download task, or record it as skipped if it is archived
+
+        Archived outputs of a multi-output task are dropped from it.
+        """
+        outputs = task.get('outputs') or [{'format_type': task['format_type'], 'format_id': task['format_id']}]
+        paths = [self.archived_path(task['url'], output['format_type'], task.get('archive_format') or output['format_id'])
+                 for output in outputs]
+        pending = [output for output, path in zip(outputs, paths) if path is None]
+        if pending:
+            if task.get('outputs'):
+                task = dict(task, outputs=pending, format_type=pending[0]['format_type'],
+                            format_id=pending[0]['format_id'])
+            return self.scheduler.submit(task, priority=priority, job_id=job_id)
+        path = paths[0]
+        job_id = self.scheduler.submit(dict(task, output=path), priority=priority, job_id=job_id, status='skipped')
+        self.metrics.finish(job_id, 'skipped')
+        self.gui_callback('download_skipped', {'job_id': job_id, 'title': task.get('title'), 'path': path})
+        return job_id
+    
+    def start_playlist_download(self, url, format_type, format_id, download_path,
+                                priority=DownloadScheduler.PRIORITY_NORMAL, archive_format=None,
+                                extra_outputs=None, playlist_id=None):
+        """Queue lazy expansion of a playlist/channel; returns the playlist ID
+
+        Entries become download jobs as their pages are fetched, reported via
+        'playlist_entry_queued' and finally 'playlist_expanded' callbacks.
+        """
+        playlist_id = playlist_id or str(uuid.uuid4())
+        self.metadata_queue.put({
+            'action': 'expand_playlist',
+            'playlist_id': playlist_id,
+            'url': url,
+            'format_type': format_type,
+            'format_id': format_id,
+            'download_path': download_path,
+            'priority': priority,
+            'archive_format': archive_format,
+            'outputs': job_outputs(format_type, format_id, extra_outputs)
         })
+        return playlist_id
+    
+    def cancel(self, job_id, keep_partial=False):
+        """Cancel a job; returns False if it already finished
+
+        A queued or paused job is dropped at once; a running one stops at its
+        next progress update and one being post-processed has ffmpeg killed.
+        Its bandwidth share and slots are freed right away. Partial files are
+        removed unless ``keep_partial``.
+        """
+        job = self.scheduler.get_job(job_id)
+        if job is None:
+            return False
+        if not self.scheduler.withdraw(job_id, 'cancelled'):
+            return self._request_stop(job_id, 'cancel', keep_partial)
+        with self._controls_lock:
+            control = self._controls.pop(job_id, None)
+        if not keep_partial:
+            self._remove_partial_files(job, control['files'] if control else ())
+        self.metrics.finish(job_id, 'cancelled')
+        self.gui_callback('download_cancelled', {'job_id': job_id, 'title': job.get('title', 'Video')})
+        return True
+    
+    def pause(self, job_id):
+        """Pause a job, keeping its partial files; resume() continues from them
+
+        Returns False if the job already finished.
+        """
+        job = self.scheduler.get_job(job_id)
+        if job is None or job['status'] == 'paused':
+            return False
+        if not self.scheduler.withdraw(job_id, 'paused'):
+            return self._request_stop(job_id, 'pause', True)
+        self.gui_callback('download_paused', {'job_id': job_id, 'title': job.get('title', 'Video')})
+        return True
+    
+    def resume(self, job_id):
+        """Queue a paused job again; returns False if it is not paused"""
+        return self.scheduler.requeue(job_id)
+    
+    def _request_stop(self, job_id, state, keep_partial):
+        """Ask a running or post-processing job to stop at its next checkpoint"""
+        with self._controls_lock:
+            job = self.scheduler.get_job(job_id)
+            if job is None or job['status'] not in ('running', 'processing'):
+                return False
+            control = self._controls.setdefault(job_id, {'state': None, 'keep_partial': False, 'files': set()})
+            control.update(state=state, keep_partial=keep_partial)
+        self.bandwidth.release(job_id)
+        # Checked after the request is visible, so a job handed to ffmpeg
+        # meanwhile is caught either here or by _download_loop
+        if self.scheduler.get_job(job_id)['status'] == 'processing':
+            self.postprocessor.cancel(job_id)
+        return True
+    
+    def resume_jobs(self):
+        """Re-queue jobs the journal saw queued or running in a previous run
+
+        Returns the resumed job IDs; partially downloaded files continue from
+        their .part offsets. Paused jobs come back paused.
+        """
+        journal = self.scheduler.journal
+        if journal is None:
+            return []
+        resumed = []
+        for job_id, task, priority, status in journal.unfinished():
+            if job_id in self.scheduler.jobs:
+                continue
+            if status == 'paused':
+                self.scheduler.submit(task, priority=priority, job_id=job_id, status='paused')
+            else:
+                resumed.append(self.scheduler.submit(task, priority=priority, job_id=job_id))
+        return resumed
+    
+    def get_job(self, job_id):
+        """Return the current state of a download job"""
+        return self.scheduler.get_job(job_id)
+    
+    def list_jobs(self, status=None):
+        """Return all download jobs, optionally filtered by status"""
+        return self.scheduler.list_jobs(status)
+
+class ThumbnailService:
+    """Loads, resizes and caches video thumbnails off the Tk thread
+
+    Fetches share one keep-alive requests.Session and a small thread pool, and
+    carry timeouts so a hung CDN cannot pile up threads. Resized images are kept
+    in a memory LRU and as JPEGs on disk. Starting a new load (or calling
+    cancel()) makes any older in-flight load drop its result.
+    """
+    MAX_BYTES = 10 * 1024 * 1024
+
+    def __init__(self, size=(200, 150), max_workers=2, cache_dir=None,
+                 max_entries=64, max_disk_entries=500, timeout=(5, 10)):
+        self.size = size
+        self.timeout = timeout
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, "thumbnails")
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_workers = max_workers
+        self._session = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="thumbnail")
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def session(self):
+        """The shared requests.Session, created with the first fetch"""
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            return self._session
+
+    def load(self, url, on_success, on_error=None):
+        """Load a thumbnail; on_success(image) runs on a pool thread unless cached in memory"""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            image = self._memory.get(url)
+            if image is not None:
+                self._memory.move_to_end(url)
+        if image is not None:
+            on_success(image)
+            return
+        self.executor.submit(self._load, url, generation, on_success, on_error)
+
+    def cancel(self):
+        """Make every in-flight load discard its result"""
+        with self._lock:
+            self._generation += 1
+
+    def _is_current(self, generation):
+        return generation == self._generation
+
+    def _load(self, url, generation, on_success, on_error):
+        """Pool task: disk cache, else download and resize"""
+        try:
+            if not self._is_current(generation):
+                return
+            image = self._load_from_disk(url)
+            if image is None:
+                image = self._download(url, generation)
+                if image is None:
+                    return
+                self._save_to_disk(url, image)
+            with self._lock:
+                self._memory[url] = image
+                while len(self._memory) > self.max_entries:
+                    self._memory.popitem(last=False)
+            if self._is_current(generation):
+                on_success(image)
+        except Exception as e:
+            if on_error and self._is_current(generation):
+                on_error(e)
+
+    def _download(self, url, generation):
+        """Fetch and decode an image, giving up early if the load went stale"""
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            buffer = BytesIO()
+            for chunk in response.iter_content(64 * 1024):
+                if not self._is_current(generation):
+                    return None
+                buffer.write(chunk)
+                if buffer.tell() > self.MAX_BYTES:
+                    raise ValueError("Thumbnail is too large")
+        buffer.seek(0)
+        img = Image.open(buffer)
+        img.draft('RGB', self.size)  # Let the JPEG decoder downscale while decoding
+        img = img.convert('RGB')
+        img.thumbnail(self.size)
+        return img
+
+    def _disk_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.jpg')
+
+    def _load_from_disk(self, url):
+        try:
+            with Image.open(self._disk_path(url)) as img:
+                img.load()
+                return img.copy()
+        except (OSError, ValueError):
+            return None
+
+    def _save_to_disk(self, url, image):
+        """Write a resized thumbnail and trim the disk cache to its newest entries"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            image.save(self._disk_path(url), 'JPEG', quality=90)
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.jpg')]
+            if len(entries) > self.max_disk_entries:
+                entries.sort(key=lambda entry: entry.stat().st_mtime)
+                for entry in entries[:len(entries) - self.max_disk_entries]:
+                    os.remove(entry.path)
+        except OSError as e:
+            print(f"Error caching thumbnail: {e}")
 
 class YouTubeDownloaderApp(customtkinter.CTk):
-    def __init__(self):
+    # Events after which a job no longer drives the progress bar
+    FINISHED_EVENTS = ('download_complete', 'download_skipped', 'download_error', 'download_cancelled')
+
+    def __init__(self, daemon_url=None, verbose=False):
         super().__init__()
         self.title("YouTube Downloader")
         self.geometry("800x650")
@@ -324,8 +2593,16 @@ class YouTubeDownloaderApp(customtkinter.CTk):
         self.grid_rowconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=0)  # Footer row
 
-        # Initialize worker
-        self.worker = DownloadWorker(self.handle_worker_callback)
+        # Initialize worker: a download daemon's client when one is configured
+        daemon_url, daemon_token = self.load_daemon_settings(daemon_url)
+        if daemon_url:
+            self.worker = RemoteWorker(daemon_url, self.handle_worker_callback, token=daemon_token)
+        else:
+            self.worker = DownloadWorker(self.handle_worker_callback, journal=self.open_journal(),
+                                         bandwidth=BandwidthLimiter.from_config(), archive=self.open_archive(),
+                                         metrics=JobMetrics(METRICS_FILE, PROMETHEUS_FILE),
+                                         scratch_dir=self.load_scratch_dir(), verbose=verbose)
+        self.thumbnails = ThumbnailService()
         
         # Setup GUI
         self.setup_gui()
@@ -333,12 +2610,64 @@ class YouTubeDownloaderApp(customtkinter.CTk):
         # Initialize variables
         self.video_info = None
         self.available_formats = {}
+        # The progress bar follows current_job_id; job_queue holds the jobs
+        # (playlist entries, resumed downloads) it moves on to afterwards
+        self.current_job_id = None
+        self.current_playlist_id = None
+        self.job_queue = []
+        self.details_url = None
         
         # Check dependencies
         self.check_dependencies()
         
         # Setup keyboard shortcuts
         self.setup_keyboard_shortcuts()
+        
+        # Pick up downloads left unfinished by the last session
+        resumed = self.worker.resume_jobs()
+        if resumed:
+            self.job_queue = list(resumed)
+            self.current_job_id = self.job_queue[0]
+            self.status_label.configure(text=f"Resuming {len(resumed)} unfinished download(s)...", text_color="blue")
+
+    def open_journal(self):
+        """Open the job journal, or run without one if it cannot be opened"""
+        try:
+            return JobJournal()
+        except sqlite3.Error as e:
+            print(f"Error opening job journal: {e}")
+            return None
+
+    def load_scratch_dir(self):
+        """Scratch directory for partial downloads from "scratch_dir" in the config, or None"""
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                scratch_dir = json.load(f).get('scratch_dir')
+        except (json.JSONDecodeError, IOError):
+            return None
+        return os.path.expanduser(scratch_dir) if scratch_dir else None
+
+    def load_daemon_settings(self, daemon_url=None):
+        """(url, token) of the download daemon to use; "daemon_url"/"daemon_token" in the config"""
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                config = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            config = {}
+        return daemon_url or config.get('daemon_url'), config.get('daemon_token')
+
+    def open_archive(self):
+        """Open the download archive; "hash_downloads" in the config enables the content index"""
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                hash_contents = bool(json.load(f).get('hash_downloads'))
+        except (json.JSONDecodeError, IOError):
+            hash_contents = False
+        try:
+            return DownloadArchive(hash_contents=hash_contents)
+        except sqlite3.Error as e:
+            print(f"Error opening download archive: {e}")
+            return None
 
     def setup_custom_theme(self):
         """Setup custom theme colors for better contrast"""
@@ -362,6 +2691,10 @@ class YouTubeDownloaderApp(customtkinter.CTk):
         # F5: Refresh app (clear all fields)
         self.bind('<F5>', self.refresh_app_shortcut)
         
+        # Esc: Cancel download, Ctrl+P: Pause/resume download
+        self.bind('<Escape>', self.cancel_download_shortcut)
+        self.bind('<Control-p>', self.pause_download_shortcut)
+        
         # Focus URL entry by default
         self.url_entry.focus_set()
     
@@ -389,6 +2722,22 @@ class YouTubeDownloaderApp(customtkinter.CTk):
             self.start_download()
         return "break"
     
+    def cancel_download_shortcut(self, event=None):
+        """Handle Esc shortcut: cancel the current download and remove its partial files"""
+        if self.current_job_id and self.worker.cancel(self.current_job_id):
+            self.status_label.configure(text="Cancelling download...", text_color="blue")
+        return "break"
+    
+    def pause_download_shortcut(self, event=None):
+        """Handle Ctrl+P shortcut: pause the current download, or resume it if paused"""
+        if not self.current_job_id:
+            return "break"
+        if self.worker.resume(self.current_job_id):
+            self.status_label.configure(text="Resuming download...", text_color="blue")
+        elif self.worker.pause(self.current_job_id):
+            self.status_label.configure(text="Pausing download...", text_color="blue")
+        return "break"
+    
     def refresh_app_shortcut(self, event=None):
         """Handle F5 shortcut to refresh the app"""
         # Clear URL entry
@@ -396,6 +2745,7 @@ class YouTubeDownloaderApp(customtkinter.CTk):
         
         # Clear video details
         self.video_title_label.configure(text="")
+        self.thumbnails.cancel()
         self.thumbnail_label.configure(image="")
         
         # Reset format selection
@@ -521,6 +2871,8 @@ class YouTubeDownloaderApp(customtkinter.CTk):
             "• Ctrl+V: Paste URL",
             "• Enter: Fetch details",
             "• Ctrl+D: Start download",
+            "• Esc: Cancel download",
+            "• Ctrl+P: Pause/resume download",
             "• F5: Refresh app"
         ]
         
@@ -626,7 +2978,7 @@ class YouTubeDownloaderApp(customtkinter.CTk):
         self.browse_button.grid(row=0, column=1, padx=0, pady=0)
         
         # Configuration file path
-        self.config_file = os.path.join(os.path.expanduser("~"), ".youtube_downloader_config.json")
+        self.config_file = CONFIG_FILE
         
         # Load saved download path or set default
         self.download_path = self.load_download_path()
@@ -685,37 +3037,40 @@ class YouTubeDownloaderApp(customtkinter.CTk):
         self.footer_label.bind("<Button-1>", self.open_creator_website)
 
     def check_dependencies(self):
-        """Check for required dependencies"""
+        """Check for required dependencies in the background; results are shown when ready
+
+        Importing yt-dlp and probing ffmpeg take long enough to delay the
+        first frame, and the import also warms yt-dlp for the first fetch.
+        """
+        self.status_label.configure(text="Checking dependencies...", text_color="gray")
+        threading.Thread(target=self._check_dependencies_worker, name="dependency-check", daemon=True).start()
+
+    def _check_dependencies_worker(self):
         # Check for yt-dlp (as Python module)
         try:
-            import yt_dlp
             # Test if yt-dlp module works by getting version
             version = yt_dlp.version.__version__
-            self.status_label.configure(text="yt-dlp found.", text_color="green")
-        except (ImportError, AttributeError) as e:
+        except (ImportError, AttributeError):
+            version = None
+        # Check for ffmpeg (local first, then system PATH)
+        ffmpeg_found = probe_ffmpeg() is not None
+        self.after(0, lambda: self._show_dependencies(version, ffmpeg_found))
+
+    def _show_dependencies(self, version, ffmpeg_found):
+        """Report dependency check results (Tk thread)"""
+        if version is None:
             self.status_label.configure(text="Error: yt-dlp module not found. Please install it (e.g., pip install yt-dlp).", text_color="red")
             self.fetch_button.configure(state="disabled")
             self.download_button.configure(state="disabled")
             return
-
-        # Check for ffmpeg (local first, then system PATH)
-        ffmpeg_found = False
-        ffmpeg_paths = [
-            resource_path(os.path.join("ffmpeg", "bin", "ffmpeg.exe")),  # Local ffmpeg (PyInstaller compatible)
-            "ffmpeg"  # System PATH
-        ]
-        
-        for ffmpeg_path in ffmpeg_paths:
-            try:
-                subprocess.run([ffmpeg_path, "-version"], check=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                self.status_label.configure(text=self.status_label.cget("text") + "\nffmpeg found.", text_color="green")
-                ffmpeg_found = True
-                break
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                continue
         
-        if not ffmpeg_found:
-            self.status_label.configure(text=self.status_label.cget("text") + "\nError: ffmpeg not found. MP3 conversion will not work.", text_color="red")
+        # Leave newer messages (e.g. fetch results) in place when all is well
+        replace = self.status_label.cget("text") == "Checking dependencies..."
+        if ffmpeg_found:
+            if replace:
+                self.status_label.configure(text="yt-dlp found.\nffmpeg found.", text_color="green")
+        else:
+            self.status_label.configure(text="yt-dlp found.\nError: ffmpeg not found. MP3 conversion will not work.", text_color="red")
             # Disable mp3 option if ffmpeg is not found
             current_values = list(self.format_optionmenu.cget("values"))
             if "mp3" in current_values:
@@ -730,21 +3085,52 @@ class YouTubeDownloaderApp(customtkinter.CTk):
     
     def _handle_worker_callback_main_thread(self, event_type, data):
         """Handle worker callbacks in main thread"""
+        if event_type in ('video_details_success', 'playlist_details_success', 'video_details_error') \
+                and data.get('url') != self.details_url:
+            return  # Details for a URL the user has since replaced
+        if event_type.startswith('download_') and data.get('job_id') is not None:
+            job_id = data['job_id']
+            if event_type in self.FINISHED_EVENTS and job_id in self.job_queue:
+                self.job_queue.remove(job_id)
+            if job_id != self.current_job_id:
+                return  # Another job in flight; the bar shows one at a time
+            if event_type in self.FINISHED_EVENTS:
+                self.current_job_id = self.job_queue[0] if self.job_queue else None
         if event_type == 'video_details_success':
             self.video_info = data
             self.video_title_label.configure(text=data['title'])
             
             # Load thumbnail
             if data.get('thumbnail'):
-                threading.Thread(target=self._load_thumbnail, args=(data['thumbnail'],), daemon=True).start()
+                self.thumbnails.load(data['thumbnail'], self._on_thumbnail_loaded, self._on_thumbnail_error)
             
             # Update format options
             self.on_format_selected(self.format_optionmenu.get())
             self.status_label.configure(text="Details fetched. Select quality and download.", text_color="green")
             self.download_button.configure(state="normal")
             
+        elif event_type == 'playlist_details_success':
+            self.video_info = data
+            count = f" ({data['entry_count']} videos)" if data.get('entry_count') else ""
+            self.video_title_label.configure(text=f"Playlist: {data['title']}{count}")
+            self.on_format_selected(self.format_optionmenu.get())
+            self.status_label.configure(text="Playlist found. Select quality and download all videos.", text_color="green")
+            self.download_button.configure(state="normal")
+            
+        elif event_type == 'playlist_entry_queued':
+            if data.get('playlist_id') == self.current_playlist_id:
+                self.job_queue.append(data['job_id'])
+                self.current_job_id = self.current_job_id or data['job_id']
+            self.status_label.configure(text=f"Queued {data['index'] + 1} videos: {data['title']}", text_color="blue")
+            
+        elif event_type == 'playlist_expanded':
+            self.status_label.configure(text=f"All {data['count']} playlist videos queued.", text_color="green")
+            
+        elif event_type == 'playlist_error':
+            self.status_label.configure(text=f"Playlist listing stopped after {data['count']} videos: {data['error']}", text_color="red")
+            
         elif event_type == 'video_details_error':
-            self.status_label.configure(text=f"Error fetching details: {data}", text_color="red")
+            self.status_label.configure(text=f"Error fetching details: {data['error']}", text_color="red")
             self.download_button.configure(state="disabled")
             
         elif event_type == 'download_progress':
@@ -757,30 +3143,41 @@ class YouTubeDownloaderApp(customtkinter.CTk):
             self.status_label.configure(text=f"Downloading: {percent} at {speed} ETA {eta}", text_color="blue")
             
         elif event_type == 'download_processing':
-            self.status_label.configure(text="Processing...", text_color="blue")
+            self.status_label.configure(text=data.get('message') or "Processing...", text_color="blue")
             
         elif event_type == 'download_complete':
             self.progress_bar.set(1)
-            self.status_label.configure(text=f"Download complete: {data}", text_color="green")
+            self.status_label.configure(text=f"Download complete: {data['title']}", text_color="green")
+            self.download_button.configure(state="normal")
+            
+        elif event_type == 'download_skipped':
+            self.progress_bar.set(1)
+            self.status_label.configure(text=f"Already downloaded: {data['path']}", text_color="green")
             self.download_button.configure(state="normal")
             
         elif event_type == 'download_error':
-            self.status_label.configure(text=f"Download failed: {data}", text_color="red")
+            self.status_label.configure(text=f"Download failed: {data['error']}", text_color="red")
+            self.download_button.configure(state="normal")
+            
+        elif event_type == 'download_paused':
+            self.status_label.configure(text=f"Paused: {data['title']} (Ctrl+P to resume)", text_color="blue")
+            
+        elif event_type == 'download_cancelled':
+            self.progress_bar.set(0)
+            self.status_label.configure(text=f"Download cancelled: {data['title']}", text_color="red")
             self.download_button.configure(state="normal")
 
-    def _load_thumbnail(self, url):
-        """Load thumbnail image"""
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            img_data = response.content
-            img = Image.open(BytesIO(img_data))
-            img.thumbnail((200, 150))
+    def _on_thumbnail_loaded(self, img):
+        """Show a loaded thumbnail (called from the thumbnail service)"""
+        def show():
             photo = customtkinter.CTkImage(light_image=img, dark_image=img, size=(img.width, img.height))
-            self.after(0, lambda: self.thumbnail_label.configure(image=photo))
-            self.after(0, lambda: setattr(self.thumbnail_label, 'image', photo))
-        except Exception as e:
-            self.after(0, lambda: self.status_label.configure(text=f"Error loading thumbnail: {e}", text_color="orange"))
+            self.thumbnail_label.configure(image=photo)
+            self.thumbnail_label.image = photo
+        self.after(0, show)
+
+    def _on_thumbnail_error(self, e):
+        """Report a failed thumbnail load (called from the thumbnail service)"""
+        self.after(0, lambda: self.status_label.configure(text=f"Error loading thumbnail: {e}", text_color="orange"))
 
     def change_appearance_mode_event(self, new_appearance_mode: str):
         """Change appearance mode"""
@@ -922,10 +3319,12 @@ class YouTubeDownloaderApp(customtkinter.CTk):
         self.quality_optionmenu.configure(state="disabled")
         self.quality_optionmenu.set("N/A")
         self.video_title_label.configure(text="")
+        self.thumbnails.cancel()
         self.thumbnail_label.configure(image=None)
         self.thumbnail_label.image = None
 
-        # Send to worker
+        # Send to worker; only the latest request's details are shown
+        self.details_url = url
         self.worker.fetch_video_details(url)
 
     def on_format_selected(self, selected_format):
@@ -1004,8 +3403,819 @@ class YouTubeDownloaderApp(customtkinter.CTk):
         self.download_button.configure(state="disabled")
         
         # Send to worker
-        self.worker.start_download(url, selected_format, format_id, self.download_path, self.video_info['title'])
+        self.job_queue = []
+        self.current_job_id = None
+        if self.video_info.get('is_playlist'):
+            self.current_playlist_id = self.worker.start_playlist_download(
+                url, selected_format, format_id, self.download_path)
+        else:
+            self.current_job_id = self.worker.start_download(
+                url, selected_format, format_id, self.download_path, self.video_info['title'])
+
+QUALITY_LABELS = {'2k': 1440, '4k': 2160, '8k': 4320}
+
+def quality_limit(quality):
+    """Height/bitrate cap of a quality rule, None for 'best'; raises ValueError if unrecognized"""
+    quality = str(quality).strip().lower()
+    if quality in ('best', ''):
+        return None
+    match = re.match(r'(\d+)', quality)
+    limit = QUALITY_LABELS.get(quality) or (int(match.group(1)) if match else None)
+    if limit is None:
+        raise ValueError(f"Unrecognized quality: {quality}")
+    return limit
+
+def choose_format(formats, format_type, quality='best'):
+    """Pick a format_id from _extract_formats() output by a quality rule
+
+    ``quality`` is 'best', a height such as '1080p'/'720' (mp4) or a bitrate
+    such as '160kbps' (m4a); the best option not above it is chosen.
+    """
+    limit = quality_limit(quality)
+    if format_type == 'mp3':
+        return "bestaudio/best"
+    options = formats.get('mp4' if format_type == 'mp4' else 'audio', [])
+    if not options:
+        return None
+    if limit is None:
+        return options[0]['format_id']
+    key = 'height' if format_type == 'mp4' else 'abr'
+    ranked = sorted((o for o in options if o.get(key)), key=lambda o: o[key], reverse=True)
+    for option in ranked:
+        if option[key] <= limit:
+            return option['format_id']
+    return ranked[-1]['format_id'] if ranked else options[0]['format_id']
+
+class BatchRunner:
+    """Headless front end: runs URLs through DownloadWorker and reports JSON Lines
+
+    Every URL is fetched, matched against the format/quality rule and queued
+    for download; each event is written to ``output`` as one JSON object.
+    ``extra_formats`` (e.g. ['mp3']) are made from the same transfer.
+    """
+    def __init__(self, format_type='mp4', quality='best', download_path=None,
+                 jobs=3, output=None, show_progress=True, bandwidth=None, archive=None,
+                 fetch_jobs=8, metrics=None, extra_formats=(), embed=True, scratch_dir=None, verbose=False):
+        self.format_type = format_type
+        self.extra_formats = list(extra_formats)
+        self.quality = quality
+        self.download_path = download_path or os.path.join(os.path.expanduser("~"), "Downloads")
+        self.output = output or sys.stdout
+        self.show_progress = show_progress
+        self.failures = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._job_urls = {}
+        self.worker = DownloadWorker(
+            self.handle_worker_callback,
+            metadata_workers=fetch_jobs,
+            download_workers=jobs,
+            quiet=True,
+            bandwidth=bandwidth,
+            archive=archive,
+            metrics=metrics,
+            embed_metadata=embed,
+            embed_thumbnail=embed,
+            scratch_dir=scratch_dir,
+            verbose=verbose
+        )
+        # Batch jobs are archived under the quality rule, so a re-run can
+        # skip finished URLs before extracting them
+        self.archive_format = f"quality={quality}"
+
+    def emit(self, event, **fields):
+        """Write one JSON Lines record"""
+        record = {'event': event, 'time': time.time()}
+        record.update(fields)
+        with self._lock:
+            self.output.write(json.dumps(record, default=str) + "\n")
+            self.output.flush()
+
+    def run(self, urls):
+        """Process all URLs and block until done; returns a process exit code"""
+        urls = [url for url in urls if url]
+        os.makedirs(self.download_path, exist_ok=True)
+        self._pending = len(urls)
+        if not urls:
+            return 0
+        pending = []
+        for url in urls:
+            paths = [self.worker.archived_path(url, format_type, self.archive_format)
+                     for format_type in [self.format_type] + self.extra_formats]
+            if all(paths):
+                self.emit('skipped', url=url, path=paths[0])
+                self._finish_one(failed=False)
+                continue
+            self.emit('queued', url=url)
+            pending.append(url)
+        self.worker.fetch_many(pending)
+        self._done.wait()
+        self.worker.metrics.flush()
+        self.emit('finished', failures=self.failures)
+        return 1 if self.failures else 0
+
+    def _finish_one(self, failed):
+        with self._lock:
+            self._pending -= 1
+            if failed:
+                self.failures += 1
+            if self._pending <= 0:
+                self._done.set()
+
+    def _extra_outputs(self, formats):
+        """(format_type, format_id) of the extra formats, by the same quality rule"""
+        return [(format_type, choose_format(formats, format_type, self.quality)) for format_type in self.extra_formats]
+
+    def handle_worker_callback(self, event_type, data):
+        """Handle callbacks from worker threads"""
+        if event_type == 'video_details_success':
+            try:
+                format_id = choose_format(data['formats'], self.format_type, self.quality)
+                extra_outputs = self._extra_outputs(data['formats'])
+            except ValueError as e:
+                format_id, error = None, str(e)
+            else:
+                missing = [format_type for format_type, extra_id in extra_outputs if not extra_id]
+                if missing:
+                    format_id = None
+                error = f"No {missing[0] if missing else self.format_type} format available"
+            if not format_id:
+                self.emit('error', url=data['url'], error=error)
+                self._finish_one(failed=True)
+                return
+            job_id = self.worker.start_download(
+                data['url'], self.format_type, format_id, self.download_path, data['title'],
+                archive_format=self.archive_format, extra_outputs=extra_outputs)
+            with self._lock:
+                self._job_urls[job_id] = data['url']
+            self.emit('details', url=data['url'], job_id=job_id, title=data['title'],
+                      duration=data['duration'], format_id=format_id)
+        elif event_type == 'playlist_details_success':
+            try:
+                format_id = choose_format(data['formats'], self.format_type, self.quality)
+                extra_outputs = self._extra_outputs(data['formats'])
+            except ValueError as e:
+                self.emit('error', url=data['url'], error=str(e))
+                self._finish_one(failed=True)
+                return
+            playlist_id = self.worker.start_playlist_download(
+                data['url'], self.format_type, format_id, self.download_path,
+                archive_format=self.archive_format, extra_outputs=extra_outputs)
+            self.emit('playlist', url=data['url'], playlist_id=playlist_id, title=data['title'],
+                      entry_count=data['entry_count'], format_id=format_id)
+        elif event_type == 'playlist_entry_queued':
+            with self._lock:
+                self._pending += 1
+                self._job_urls[data['job_id']] = data['url']
+            self.emit('queued', **data)
+        elif event_type in ('playlist_expanded', 'playlist_error'):
+            self.emit('expanded' if event_type == 'playlist_expanded' else 'error', **data)
+            self._finish_one(failed=event_type == 'playlist_error')
+        elif event_type == 'video_details_error':
+            self.emit('error', url=data['url'], error=data['error'])
+            self._finish_one(failed=True)
+        elif event_type == 'download_progress':
+            if self.show_progress:
+                self.emit('progress', url=self._job_urls.get(data['job_id']), **data)
+        elif event_type == 'download_processing':
+            self.emit('processing', url=self._job_urls.get(data['job_id']), **data)
+        elif event_type == 'download_complete':
+            self.emit('complete', url=self._job_urls.get(data['job_id']), **data)
+            self._finish_one(failed=False)
+        elif event_type == 'download_skipped':
+            self.emit('skipped', url=self._job_urls.get(data['job_id']), **data)
+            self._finish_one(failed=False)
+        elif event_type == 'download_paused':
+            self.emit('paused', url=self._job_urls.get(data['job_id']), **data)
+        elif event_type == 'download_cancelled':
+            self.emit('cancelled', url=self._job_urls.get(data['job_id']), **data)
+            self._finish_one(failed=False)
+        elif event_type == 'download_error':
+            self.emit('error', url=self._job_urls.get(data['job_id']), **data)
+            self._finish_one(failed=True)
+
+DAEMON_PORT = 8765
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+class EventHub:
+    """Fans worker callbacks out to any number of listeners, e.g. /events streams
+
+    Each listener has its own bounded queue; one that stops reading loses
+    events instead of holding up the worker threads.
+    """
+    def __init__(self, backlog=1000):
+        self.backlog = backlog
+        self._listeners = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event_type, data):
+        """Worker callback: queue the event for every listener"""
+        record = {'event': event_type, 'data': data}
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener.put_nowait(record)
+            except queue.Full:
+                pass
+
+    def listen(self):
+        """A new queue that receives every event from now on"""
+        listener = queue.Queue(maxsize=self.backlog)
+        with self._lock:
+            self._listeners.add(listener)
+        return listener
+
+    def unlisten(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
+
+class DownloadDaemon:
+    """One shared DownloadWorker behind a local HTTP/JSON API
+
+        GET  /jobs[?status=queued]           all jobs
+        POST /jobs                           submit {"url", "format_type", "format_id" or "quality", ...}
+        GET  /jobs/<id>                      one job; "results" lists its files once complete
+        GET  /jobs/<id>/files/<n>            the n-th result file itself
+        POST /jobs/<id>/cancel|pause|resume
+        POST /details                        {"url"}: the details the GUI shows
+        GET  /events                         worker events as Server-Sent Events
+        GET  /metrics                        Prometheus text
+
+    Scripts, other machines and the GUI (see RemoteWorker) all feed the same
+    scheduler, so concurrency, bandwidth and the archive are shared. With a
+    token, every request needs "Authorization: Bearer <token>".
+    """
+    DETAILS_TIMEOUT = 120
+    KEEPALIVE = 15
+    FORMAT_TYPES = ('mp4', 'm4a', 'mp3')
+
+    def __init__(self, host='127.0.0.1', port=DAEMON_PORT, download_path=None, token=None, **worker_options):
+        # Imported here to keep http.server (and ssl with it) off the GUI's startup path
+        import http.server
+        self.download_path = download_path or os.path.join(os.path.expanduser("~"), "Downloads")
+        self.token = token
+        self.events = EventHub()
+        self.worker = DownloadWorker(self.events.publish, **worker_options)
+        self.server = http.server.ThreadingHTTPServer((host, port), self._handler_class(http.server))
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{f'[{host}]' if ':' in host else host}:{port}"
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def shutdown(self):
+        """Stop serving; call from another thread than serve_forever()"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self, http_server):
+        daemon = self
+
+        class DaemonRequestHandler(http_server.BaseHTTPRequestHandler):
+            server_version = "yt-downloader"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                daemon._dispatch(self, 'GET')
+
+            def do_POST(self):
+                daemon._dispatch(self, 'POST')
+
+        return DaemonRequestHandler
+
+    def _dispatch(self, request, method):
+        """Authenticate, route and answer one request"""
+        parsed = urlparse(request.path)
+        parts = [part for part in parsed.path.split('/') if part]
+        refusal = self._refusal(request, method)
+        if refusal:
+            return self._send_json(request, 403, {'error': refusal})
+        if self.token and request.headers.get('Authorization') != f"Bearer {self.token}":
+            return self._send_json(request, 401, {'error': "Missing or wrong token"})
+        if method == 'GET' and parts == ['events']:
+            return self._stream_events(request)
+        if method == 'GET' and len(parts) == 4 and parts[0] == 'jobs' and parts[2] == 'files':
+            return self._send_file(request, parts[1], parts[3])
+        if method == 'GET' and parts == ['metrics']:
+            body = self.worker.metrics.render_prometheus().encode()
+            return self._send(request, 200, body, 'text/plain; version=0.0.4')
+        try:
+            body = self._read_json(request) if method == 'POST' else {}
+            status, payload = self._route(method, parts, parse_qs(parsed.query), body)
+        except ValueError as e:
+            status, payload = 400, {'error': str(e)}
+        except Exception as e:
+            print(f"Error handling {method} {parsed.path}: {e}")
+            status, payload = 500, {'error': str(e)}
+        self._send_json(request, status, payload)
+
+    def _refusal(self, request, method):
+        """Why a request that may come from a web page is refused, or None
+
+        Browsers send Origin on cross-site POSTs and can't set a JSON body
+        without a CORS preflight, which is never answered. A loopback daemon
+        also insists on a loopback Host, against DNS rebinding.
+        """
+        if request.headers.get('Origin'):
+            return "Requests from web pages are not accepted"
+        if method == 'POST' and int(request.headers.get('Content-Length') or 0):
+            if (request.headers.get('Content-Type') or '').split(';')[0].strip().lower() != 'application/json':
+                return "Request bodies must be sent as application/json"
+        if self.server.server_address[0] in LOOPBACK_HOSTS:
+            host = urlparse(f"//{request.headers.get('Host') or ''}").hostname
+            if host not in LOOPBACK_HOSTS:
+                return f"Host {host!r} is not served here"
+        return None
+
+    def _download_path(self, requested):
+        """Where a job may write: ``requested`` (relative paths are taken from the
+        daemon's download path) as long as it stays inside that directory"""
+        root = os.path.realpath(self.download_path)
+        if not requested:
+            return root
+        path = os.path.realpath(os.path.join(root, os.path.expanduser(requested)))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"download_path must be inside {root}")
+        return path
+
+    def _route(self, method, parts, query, body):
+        """(HTTP status, JSON payload) of an API call"""
+        if parts == ['jobs'] and method == 'GET':
+            return 200, {'jobs': self.worker.list_jobs(query.get('status', [None])[0])}
+        if parts == ['jobs'] and method == 'POST':
+            return self._submit(body)
+        if parts == ['details'] and method == 'POST':
+            if not body.get('url'):
+                raise ValueError("'url' is required")
+            try:
+                details = self.worker.fetch_video_details(body['url']).result(timeout=self.DETAILS_TIMEOUT)
+            except Exception as e:
+                return 502, {'error': str(e)}
+            return 200, dict(details, url=body['url'])
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.worker.get_job(parts[1])
+            if job is None:
+                return 404, {'error': f"Unknown job: {parts[1]}"}
+            if len(parts) == 2 and method == 'GET':
+                return 200, job
+            if len(parts) == 3 and method == 'POST' and parts[2] in ('cancel', 'pause', 'resume'):
+                if parts[2] == 'cancel':
+                    done = self.worker.cancel(parts[1], keep_partial=bool(body.get('keep_partial')))
+                else:
+                    done = getattr(self.worker, parts[2])(parts[1])
+                if not done:
+                    return 409, {'error': f"Cannot {parts[2]} a {job['status']} job"}
+                return 200, self.worker.get_job(parts[1])
+        return 404, {'error': f"No such endpoint: {method} /{'/'.join(parts)}"}
+
+    def _submit(self, body):
+        """POST /jobs: queue a video or playlist, picking formats by quality when no ID is given
+
+        "extra_formats" (e.g. ["mp3"]) are picked by the same quality rule;
+        "extra_outputs" gives [format_type, format_id] pairs outright.
+        """
+        url = body.get('url')
+        if not url:
+            raise ValueError("'url' is required")
+        format_type = body.get('format_type', 'mp4')
+        extra_formats = list(body.get('extra_formats') or ())
+        for name in [format_type] + extra_formats:
+            if name not in self.FORMAT_TYPES:
+                raise ValueError(f"Invalid format: {name!r} (choose from {', '.join(self.FORMAT_TYPES)})")
+        extra_outputs = body.get('extra_outputs') or []
+        if not isinstance(extra_outputs, list):
+            raise ValueError("'extra_outputs' must be a list of [format_type, format_id] pairs")
+        for pair in extra_outputs:
+            if not (isinstance(pair, list) and len(pair) == 2 and pair[0] in self.FORMAT_TYPES
+                    and isinstance(pair[1], str) and pair[1]):
+                raise ValueError(f"Invalid extra output: {pair!r} (expected [format_type, format_id])")
+        download_path = self._download_path(body.get('download_path'))
+        job_id, playlist_id = body.get('job_id'), body.get('playlist_id')
+        for chosen in (job_id, playlist_id):
+            if chosen is not None:
+                uuid.UUID(str(chosen))  # Client-chosen IDs end up in file names
+        if job_id and self.worker.get_job(job_id):
+            return 409, {'error': f"Job {job_id} already exists"}
+        quality = body.get('quality', 'best')
+        format_id = body.get('format_id')
+        is_playlist = bool(body.get('playlist'))
+        title = body.get('title')
+        formats = {}
+        if not format_id or any(name != 'mp3' for name in extra_formats):
+            try:
+                details = self.worker.fetch_video_details(url).result(timeout=self.DETAILS_TIMEOUT)
+            except Exception as e:
+                return 502, {'error': str(e)}
+            formats = details['formats']
+            is_playlist = bool(details.get('is_playlist'))
+            title = title or details['title']
+            format_id = format_id or choose_format(formats, format_type, quality)
+        extra_outputs = [tuple(pair) for pair in extra_outputs]
+        extra_outputs += [(name, choose_format(formats, name, quality)) for name in extra_formats]
+        missing = [name for name, extra_id in [(format_type, format_id)] + extra_outputs if not extra_id]
+        if missing:
+            return 422, {'error': f"No {missing[0]} format available"}
+        options = {
+            'priority': int(body.get('priority', DownloadScheduler.PRIORITY_NORMAL)),
+            'archive_format': body.get('archive_format'),
+            'extra_outputs': extra_outputs,
+        }
+        if is_playlist:
+            playlist_id = self.worker.start_playlist_download(
+                url, format_type, format_id, download_path, playlist_id=playlist_id, **options)
+            return 202, {'playlist_id': playlist_id, 'format_id': format_id}
+        job_id = self.worker.start_download(url, format_type, format_id, download_path, title or url,
+                                           job_id=job_id, **options)
+        return 201, self.worker.get_job(job_id)
+
+    def _stream_events(self, request):
+        """GET /events: every worker event until the client disconnects"""
+        listener = self.events.listen()
+        try:
+            request.send_response(200)
+            request.send_header('Content-Type', 'text/event-stream')
+            request.send_header('Cache-Control', 'no-cache')
+            request.end_headers()
+            request.wfile.write(b": connected\n\n")
+            while True:
+                try:
+                    record = listener.get(timeout=self.KEEPALIVE)
+                except queue.Empty:
+                    request.wfile.write(b": keepalive\n\n")
+                    continue
+                data = json.dumps(record['data'], default=str)
+                request.wfile.write(f"event: {record['event']}\ndata: {data}\n\n".encode())
+        except OSError:
+            pass  # The client went away
+        finally:
+            self.events.unlisten(listener)
+
+    def _send_file(self, request, job_id, index):
+        """GET /jobs/<id>/files/<n>: stream a finished job's output file"""
+        job = self.worker.get_job(job_id) or {}
+        paths = [result['path'] for result in job.get('results') or ()]
+        if not paths and job.get('output'):
+            paths = [job['output']]  # Skipped as already downloaded
+        try:
+            path = paths[int(index)]
+            source = open(path, 'rb')
+        except (ValueError, IndexError, OSError):
+            return self._send_json(request, 404, {'error': f"No file {index} for job {job_id}"})
+        with source:
+            request.send_response(200)
+            request.send_header('Content-Type', 'application/octet-stream')
+            request.send_header('Content-Length', str(os.fstat(source.fileno()).st_size))
+            request.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(os.path.basename(path))}")
+            request.end_headers()
+            try:
+                shutil.copyfileobj(source, request.wfile, 1 << 20)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _read_json(request):
+        length = int(request.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = json.loads(request.rfile.read(length))
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _send(request, status, body, content_type):
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        try:
+            request.wfile.write(body)
+        except OSError:
+            pass
+
+    def _send_json(self, request, status, payload):
+        self._send(request, status, json.dumps(payload, default=str).encode(), 'application/json')
+
+class RemoteWorker:
+    """DownloadWorker stand-in that drives a DownloadDaemon over HTTP
+
+    Has the methods the GUI uses. The daemon's /events stream is followed
+    in the background and events about jobs submitted through this client
+    reach ``gui_callback`` as they would from a local worker. Submissions and
+    job actions are sent in order on a background thread so a slow daemon
+    never blocks the caller. Files are written under the daemon's own
+    download directory: only a relative ``download_path`` is passed on.
+    """
+    RECONNECT_DELAY = 2
+
+    def __init__(self, base_url, gui_callback, token=None):
+        self.base_url = base_url.rstrip('/')
+        self.gui_callback = gui_callback
+        self.headers = {'Content-Type': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f"Bearer {token}"
+        self._followed = set()
+        self._paused = set()
+        self._lock = threading.Lock()
+        self._details = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="remote-details")
+        self._calls = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="remote-calls")
+        threading.Thread(target=self._follow_events, name="daemon-events", daemon=True).start()
+
+    def _request(self, method, path, payload=None, timeout=30):
+        """(HTTP status, decoded JSON body) of an API call; raises OSError if the daemon is unreachable"""
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urlrequest.Request(self.base_url + path, data=data, method=method, headers=self.headers)
+        try:
+            with urlrequest.urlopen(request, timeout=timeout) as response:
+                return response.status, json.loads(response.read() or b'{}')
+        except urlrequest.HTTPError as e:
+            with e:
+                return e.code, json.loads(e.read() or b'{}')
+
+    def _follow(self, *ids):
+        with self._lock:
+            self._followed.update(ids)
+
+    def _follow_events(self):
+        """Pass the daemon's events for our jobs to the GUI callback, reconnecting as needed"""
+        request = urlrequest.Request(self.base_url + '/events', headers=self.headers)
+        while True:
+            try:
+                with urlrequest.urlopen(request, timeout=DownloadDaemon.KEEPALIVE * 4) as response:
+                    event_type = None
+                    for line in response:
+                        line = line.decode('utf-8').rstrip('\r\n')
+                        if line.startswith('event: '):
+                            event_type = line[7:]
+                        elif line.startswith('data: ') and event_type:
+                            self._dispatch(event_type, json.loads(line[6:]))
+                        elif not line:
+                            event_type = None
+            except (OSError, ValueError) as e:
+                print(f"Error following daemon events: {e}")
+            time.sleep(self.RECONNECT_DELAY)
+
+    def _dispatch(self, event_type, data):
+        with self._lock:
+            if event_type == 'playlist_entry_queued' and data.get('playlist_id') in self._followed:
+                self._followed.add(data['job_id'])
+            ours = data.get('job_id') in self._followed or data.get('playlist_id') in self._followed
+            if event_type == 'download_paused':
+                self._paused.add(data.get('job_id'))
+            else:
+                self._paused.discard(data.get('job_id'))
+        if ours:
+            self.gui_callback(event_type, data)
+
+    @staticmethod
+    def _remote_path(download_path):
+        """The download_path to send: local absolute paths mean nothing to the daemon"""
+        if download_path and not os.path.isabs(os.path.expanduser(download_path)):
+            return download_path
+        return None
+
+    def _submit(self, payload):
+        """POST /jobs; reports a refusal as a download error and returns None"""
+        try:
+            status, body = self._request('POST', '/jobs', payload)
+        except (OSError, ValueError) as e:
+            status, body = None, {'error': f"Daemon unreachable: {e}"}
+        if status in (201, 202):
+            return body
+        self.gui_callback('download_error', {'job_id': payload.get('job_id'), 'error': body.get('error') or f"HTTP {status}"})
+        return None
+
+    def fetch_video_details(self, url):
+        """Fetch details through the daemon; returns a Future of the details"""
+        return self._details.submit(self._fetch_video_details, url)
+
+    def _fetch_video_details(self, url):
+        try:
+            status, body = self._request('POST', '/details', {'url': url}, timeout=DownloadDaemon.DETAILS_TIMEOUT + 10)
+        except (OSError, ValueError) as e:
+            status, body = None, {'error': f"Daemon unreachable: {e}"}
+        if status != 200:
+            self.gui_callback('video_details_error', {'url': url, 'error': body.get('error') or f"HTTP {status}"})
+            raise RuntimeError(body.get('error') or f"HTTP {status}")
+        self.gui_callback('playlist_details_success' if body.get('is_playlist') else 'video_details_success', body)
+        return body
+
+    def start_download(self, url, format_type, format_id, download_path, title,
+                       priority=DownloadScheduler.PRIORITY_NORMAL, archive_format=None, extra_outputs=None):
+        """Queue a download on the daemon; returns its job ID (a refusal arrives as download_error)"""
+        job_id = str(uuid.uuid4())
+        self._follow(job_id)
+        self._calls.submit(self._submit, {
+            'url': url, 'format_type': format_type, 'format_id': format_id,
+            'download_path': self._remote_path(download_path), 'title': title, 'priority': priority,
+            'archive_format': archive_format, 'extra_outputs': extra_outputs, 'job_id': job_id,
+        })
+        return job_id
+
+    def start_playlist_download(self, url, format_type, format_id, download_path,
+                                priority=DownloadScheduler.PRIORITY_NORMAL, archive_format=None,
+                                extra_outputs=None):
+        """Queue a playlist on the daemon; returns its playlist ID (a refusal arrives as download_error)"""
+        playlist_id = str(uuid.uuid4())
+        self._follow(playlist_id)
+        self._calls.submit(self._submit, {
+            'url': url, 'format_type': format_type, 'format_id': format_id,
+            'download_path': self._remote_path(download_path), 'priority': priority,
+            'archive_format': archive_format, 'extra_outputs': extra_outputs,
+            'playlist': True, 'playlist_id': playlist_id,
+        })
+        return playlist_id
+
+    def _job_action(self, job_id, action, payload=None):
+        """Queue a job action behind any pending submissions; returns True once queued"""
+        def send():
+            try:
+                status, body = self._request('POST', f"/jobs/{job_id}/{action}", payload)
+            except (OSError, ValueError) as e:
+                print(f"Error asking the daemon to {action} {job_id}: {e}")
+                return
+            if status != 200:
+                print(f"Error asking the daemon to {action} {job_id}: {body.get('error') or f'HTTP {status}'}")
+        self._calls.submit(send)
+        return True
+
+    def cancel(self, job_id, keep_partial=False):
+        return self._job_action(job_id, 'cancel', {'keep_partial': keep_partial})
+
+    def pause(self, job_id):
+        return self._job_action(job_id, 'pause')
+
+    def resume(self, job_id):
+        """Resume a job the daemon reported as paused; False if it isn't"""
+        with self._lock:
+            if job_id not in self._paused:
+                return False
+            self._paused.discard(job_id)
+        return self._job_action(job_id, 'resume')
+
+    def resume_jobs(self):
+        """The daemon resumes its own journal; nothing to do here"""
+        return []
+
+    def get_job(self, job_id):
+        try:
+            status, body = self._request('GET', f"/jobs/{job_id}")
+        except (OSError, ValueError) as e:
+            print(f"Error fetching job {job_id}: {e}")
+            return None
+        return body if status == 200 else None
+
+    def list_jobs(self, status=None):
+        query = f"?status={quote(status)}" if status else ""
+        try:
+            _, body = self._request('GET', f"/jobs{query}")
+        except (OSError, ValueError) as e:
+            print(f"Error listing jobs: {e}")
+            return []
+        return body.get('jobs', [])
+
+def read_urls(source):
+    """URLs from a file path or '-' for stdin, skipping blanks and # comments"""
+    stream = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+    try:
+        return [line.strip() for line in stream if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def format_list(value):
+    """--format value: comma-separated output types, e.g. 'mp4,mp3'"""
+    formats = [item.strip().lower() for item in value.split(',') if item.strip()]
+    invalid = [item for item in formats if item not in ('mp4', 'm4a', 'mp3')]
+    if not formats or invalid:
+        raise argparse.ArgumentTypeError(f"invalid format: {', '.join(invalid) or value!r} (choose from mp4, m4a, mp3)")
+    return list(dict.fromkeys(formats))
+
+def quality_rule(value):
+    """--quality value: checked up front, so a typo doesn't fail every URL"""
+    try:
+        quality_limit(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+def parse_args(argv=None):
+    """Command line options; without --batch or --daemon the GUI starts"""
+    parser = argparse.ArgumentParser(description="YouTube Downloader")
+    parser.add_argument('--batch', metavar='FILE', help="Download URLs listed in FILE ('-' for stdin) without the GUI")
+    parser.add_argument('--format', dest='format_type', type=format_list, default=['mp4'],
+                        help="mp4, m4a or mp3; several comma-separated (e.g. mp4,mp3) share one download")
+    parser.add_argument('--quality', type=quality_rule, default='best', help="'best', a height like 1080p, or a bitrate like 160kbps")
+    parser.add_argument('--output', help="Download directory (default: ~/Downloads)")
+    parser.add_argument('--jobs', type=int, default=3, help="Parallel downloads")
+    parser.add_argument('--fetch-jobs', type=int, default=8, help="Parallel metadata extractions")
+    parser.add_argument('--no-progress', action='store_true', help="Only report queued/complete/error events")
+    parser.add_argument('--no-archive', action='store_true', help="Download even what the archive lists as done")
+    parser.add_argument('--hash-contents', action='store_true',
+                        help="Also index finished files by SHA-256 to find renamed files and drop duplicates")
+    parser.add_argument('--metrics', default=METRICS_FILE, metavar='FILE',
+                        help="Append per-job stage timings to FILE as JSON Lines")
+    parser.add_argument('--prometheus', default=PROMETHEUS_FILE, metavar='FILE',
+                        help="Keep FILE updated with Prometheus text-format totals")
+    parser.add_argument('--limit-rate', type=float, metavar='MBPS',
+                        help="Total download budget in Mbit/s (overrides the configured default rate)")
+    parser.add_argument('--no-embed', action='store_true', help="Don't write tags and cover art into outputs")
+    parser.add_argument('--scratch', metavar='DIR',
+                        help="Write partial downloads and intermediates to DIR (e.g. a local SSD); "
+                             "only finished files are moved to --output")
+    parser.add_argument('--daemon', action='store_true', help="Serve the HTTP/JSON job API instead of the GUI")
+    parser.add_argument('--host', default='127.0.0.1', help="Address the daemon listens on")
+    parser.add_argument('--port', type=int, default=DAEMON_PORT, help="Port the daemon listens on")
+    parser.add_argument('--token', help="Require this bearer token from daemon clients "
+                                        "(default: \"daemon_token\" in the config)")
+    parser.add_argument('--journal', default=DAEMON_JOURNAL_FILE, metavar='FILE',
+                        help="Job journal the daemon resumes from (one daemon per file)")
+    parser.add_argument('--connect', metavar='URL', help="Run the GUI as a client of the daemon at URL")
+    parser.add_argument('--debug', action='store_true', help="Print yt-dlp's debug output to stderr")
+    return parser.parse_args(argv)
+
+def run_daemon(args):
+    """--daemon: serve the job API until interrupted"""
+    bandwidth = BandwidthLimiter.from_config()
+    if args.limit_rate is not None:
+        bandwidth.set_rate(mbps(args.limit_rate))
+    try:
+        journal = JobJournal(args.journal)
+    except sqlite3.Error as e:
+        print(f"Error opening job journal: {e}")
+        journal = None
+    token = args.token
+    if token is None:
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                token = json.load(f).get('daemon_token')
+        except (json.JSONDecodeError, IOError):
+            token = None
+    if args.host not in LOOPBACK_HOSTS and not token:
+        print(f"Warning: serving on {args.host} without --token; anyone who can reach it can queue downloads")
+    daemon = DownloadDaemon(
+        args.host, args.port,
+        download_path=args.output,
+        token=token,
+        download_workers=args.jobs,
+        metadata_workers=args.fetch_jobs,
+        quiet=True,
+        journal=journal,
+        bandwidth=bandwidth,
+        archive=None if args.no_archive else DownloadArchive(hash_contents=args.hash_contents),
+        metrics=JobMetrics(args.metrics, args.prometheus),
+        embed_metadata=not args.no_embed,
+        embed_thumbnail=not args.no_embed,
+        scratch_dir=args.scratch,
+        verbose=args.debug
+    )
+    resumed = daemon.worker.resume_jobs()
+    print(f"Serving the download API on {daemon.url} ({len(resumed)} unfinished job(s) resumed)", flush=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server.server_close()
+        daemon.worker.metrics.flush()
+    return 0
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.daemon:
+        return run_daemon(args)
+    if args.batch:
+        bandwidth = BandwidthLimiter.from_config()
+        if args.limit_rate is not None:
+            bandwidth.set_rate(mbps(args.limit_rate))
+        archive = None if args.no_archive else DownloadArchive(hash_contents=args.hash_contents)
+        runner = BatchRunner(
+            format_type=args.format_type[0],
+            extra_formats=args.format_type[1:],
+            quality=args.quality,
+            download_path=args.output,
+            jobs=args.jobs,
+            fetch_jobs=args.fetch_jobs,
+            show_progress=not args.no_progress,
+            bandwidth=bandwidth,
+            archive=archive,
+            metrics=JobMetrics(args.metrics, args.prometheus),
+            embed=not args.no_embed,
+            scratch_dir=args.scratch,
+            verbose=args.debug
+        )
+        return runner.run(read_urls(args.batch))
+    app = YouTubeDownloaderApp(daemon_url=args.connect, verbose=args.debug)
+    app.mainloop()
+    return 0
 
 if __name__ == "__main__":
-    app = YouTubeDownloaderApp()
-    app.mainloop()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""Synthetic media served from a local HTTP server, for offline benchmarks
+
+Generates a random-byte progressive file (throughput only; nothing decodes
+it) and, when ffmpeg is available, a real test-pattern video as a
+progressive mp4, a DASH manifest, an HLS playlist and separate video/audio
+files for post-processing. Everything is served from 127.0.0.1 with Range
+support, so yt-dlp's generic extractor and chunked downloads work as they
+would against a CDN.
+"""
+import functools
+import http.server
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static files with single-range "Range: bytes=" support and no request log"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        # Plain GETs: a client that stops reading early is not an error
+        try:
+            super().copyfile(source, outputfile)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            return super().do_GET()
+        size = os.path.getsize(path)
+        start = int(match.group(1)) if match.group(1) else max(0, size - int(match.group(2) or 0))
+        end = min(size - 1, int(match.group(2))) if match.group(1) and match.group(2) else size - 1
+        if start >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.end_headers()
+            return
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            try:
+                while remaining:
+                    block = f.read(min(1 << 20, remaining))
+                    if not block:
+                        break
+                    self.wfile.write(block)
+                    remaining -= len(block)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+class QuietHTTPServer(http.server.ThreadingHTTPServer):
+    """ThreadingHTTPServer that prints no traceback when a client hangs up"""
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MediaServer:
+    """Generate the benchmark media into a temp directory and serve it
+
+        with MediaServer(size_mb=64, ffmpeg='/usr/bin/ffmpeg') as server:
+            server.url('progressive.mp4')
+    """
+    DURATION = 10  # Seconds of test-pattern video
+
+    def __init__(self, size_mb=64, ffmpeg=None, root=None):
+        self.size_mb = size_mb
+        self.ffmpeg = ffmpeg
+        self.root = root
+        self._owns_root = root is None
+        self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        if self.root is None:
+            self.root = tempfile.mkdtemp(prefix="ytdl-bench-media-")
+        self.generate()
+        handler = functools.partial(RangeRequestHandler, directory=self.root)
+        self._server = QuietHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="media-server", daemon=True).start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._owns_root and self.root:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/{name}"
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    @property
+    def has_av(self):
+        """Whether the ffmpeg-generated media exists"""
+        return os.path.exists(self.path('av.mp4'))
+
+    def generate(self):
+        """Write any media not already in the root directory"""
+        progressive = self.path('progressive.mp4')
+        if not os.path.exists(progressive):
+            with open(progressive, 'wb') as f:
+                for _ in range(self.size_mb):
+                    f.write(os.urandom(1 << 20))
+        if not self.ffmpeg or self.has_av:
+            return
+        sources = [
+            '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={self.DURATION}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={self.DURATION}',
+        ]
+        video = ['-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60', '-pix_fmt', 'yuv420p']
+        audio = ['-c:a', 'aac', '-b:a', '128k']
+        os.makedirs(self.path('dash'), exist_ok=True)
+        os.makedirs(self.path('hls'), exist_ok=True)
+        self._ffmpeg(*sources, '-map', '0:v', '-map', '1:a', *video, *audio, self.path('av.tmp.mp4'))
+        self._ffmpeg(*sources, '-map', '0:v', *video, self.path('video.mp4'))
+        self._ffmpeg(*sources, '-map', '1:a', *audio, self.path('audio.m4a'))
+        self._ffmpeg('-i', self.path('av.tmp.mp4'), '-map', '0:v', '-map', '0:a', '-c', 'copy',
+                     '-f', 'dash', '-seg_duration', '1', self.path('dash/manifest.mpd'))
+        # fMP4 segments, like modern HLS CDNs serve
+        self._ffmpeg('-i', self.path('av.tmp.mp4'), '-c', 'copy', '-f', 'hls', '-hls_time', '1',
+                     '-hls_playlist_type', 'vod', '-hls_segment_type', 'fmp4', self.path('hls/index.m3u8'))
+        # Written last: its presence marks the set as complete
+        os.replace(self.path('av.tmp.mp4'), self.path('av.mp4'))
+
+    def _ffmpeg(self, *args):
+        subprocess.run([self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', *args],
+                       check=True, stdin=subprocess.DEVNULL)
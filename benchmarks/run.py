@@ -0,0 +1,272 @@
+"""Offline benchmark suite for the download pipeline
+
+Serves synthetic media from a local HTTP server (see media_server.py) and
+drives DownloadWorker through yt-dlp's generic extractor, so no internet
+access is needed. Each case runs ``--repeat`` times and keeps its best
+result, which is then compared against benchmarks/baselines.json; the run
+fails when a case is worse than its baseline by more than the tolerance.
+
+    python benchmarks/run.py                    # run and compare
+    python benchmarks/run.py --only extract_formats
+    python benchmarks/run.py --update-baselines # after an intended change
+
+Baselines are machine-specific: record them on the machine that runs the
+comparison. Cases needing ffmpeg are skipped when it is not installed.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCH_DIR)
+BASELINES_FILE = os.path.join(BENCH_DIR, 'baselines.json')
+DEFAULT_TOLERANCE = 0.5
+
+# Keep the app's config, caches and journal out of the user's home
+os.environ['HOME'] = os.environ['USERPROFILE'] = tempfile.mkdtemp(prefix="ytdl-bench-home-")
+sys.path.insert(0, REPO)
+
+import app_threaded  # noqa: E402
+import startup  # noqa: E402
+from media_server import MediaServer  # noqa: E402
+
+
+class Context:
+    """What the cases share: the media server, ffmpeg and a scratch directory"""
+
+    def __init__(self, server, ffmpeg):
+        self.server = server
+        self.ffmpeg = ffmpeg
+        self.scratch = tempfile.mkdtemp(prefix="ytdl-bench-out-")
+
+    def worker(self):
+        """A fresh DownloadWorker with an empty info cache"""
+        return app_threaded.DownloadWorker(
+            lambda event, data: None,
+            info_cache=app_threaded.InfoCache(cache_dir=tempfile.mkdtemp(dir=self.scratch)),
+            quiet=True
+        )
+
+    def download(self, name, format_type='mp4', format_id='best'):
+        """Download one served file through a worker; returns seconds taken"""
+        out = tempfile.mkdtemp(dir=self.scratch)
+        worker = self.worker()
+        started = time.perf_counter()
+        job_id = worker.start_download(self.server.url(name), format_type, format_id, out, name)
+        while True:
+            job = worker.get_job(job_id)
+            if job['status'] in ('completed', 'failed'):
+                break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        shutil.rmtree(out, ignore_errors=True)
+        if job['status'] == 'failed':
+            raise RuntimeError(f"Download of {name} failed: {job['error']}")
+        return elapsed
+
+
+def bench_progressive_throughput(ctx):
+    """Progressive single-file download, extraction included"""
+    seconds = ctx.download('progressive.mp4')
+    return os.path.getsize(ctx.server.path('progressive.mp4')) / seconds / 1e6
+
+
+def bench_dash_download(ctx):
+    """DASH video+audio: fragments, merge and all"""
+    return ctx.download('dash/manifest.mpd')
+
+
+def bench_hls_download(ctx):
+    """HLS muxed stream"""
+    return ctx.download('hls/index.m3u8')
+
+
+def bench_progress_overhead(ctx, calls=100000):
+    """Cost of what the progress hook does per chunk: budget charge plus bus update"""
+    bus = app_threaded.ProgressBus()
+    bus.subscribe(lambda states: None)
+    bandwidth = app_threaded.BandwidthLimiter()
+    started = time.perf_counter()
+    for index in range(calls):
+        bandwidth.consume('job', 1024)
+        bus.update('job', index * 1024, calls * 1024)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def synthetic_formats(copies=8):
+    """A YouTube-sized format list (~1.5k entries) without any network"""
+    formats = []
+    heights = (144, 240, 360, 480, 720, 1080, 1440, 2160, 4320)
+    for copy in range(copies):
+        for height in heights:
+            for vcodec, ext in (('avc1.640028', 'mp4'), ('vp09.00.40.08', 'webm'), ('av01.0.08M.08', 'mp4')):
+                for fps in (30, 60):
+                    formats.append({
+                        'format_id': f"v{copy}-{height}-{vcodec[:4]}-{fps}",
+                        'url': f"https://media.example/v/{copy}/{height}/{fps}",
+                        'ext': ext, 'protocol': 'https', 'vcodec': vcodec, 'acodec': 'none',
+                        'height': height, 'width': height * 16 // 9, 'fps': fps,
+                        'tbr': height * fps / 10, 'filesize': height * 100000,
+                    })
+        for abr in (48, 64, 128, 160, 256):
+            for acodec, ext in (('mp4a.40.2', 'm4a'), ('opus', 'webm')):
+                formats.append({
+                    'format_id': f"a{copy}-{abr}-{acodec[:4]}",
+                    'url': f"https://media.example/a/{copy}/{abr}",
+                    'ext': ext, 'protocol': 'https', 'vcodec': 'none', 'acodec': acodec,
+                    'abr': abr, 'tbr': abr, 'filesize': abr * 10000,
+                })
+    return formats
+
+
+def bench_extract_formats(ctx):
+    """_extract_formats (with local resolution) on a large format list"""
+    worker = ctx.worker()
+    formats = synthetic_formats()
+    worker._extract_formats(formats)  # Warm the selector cache
+    started = time.perf_counter()
+    worker._extract_formats(formats)
+    return (time.perf_counter() - started) * 1000
+
+
+def _postprocess(ctx, command):
+    pool = app_threaded.PostProcessPool(max_workers=1)
+    started = time.perf_counter()
+    pool.submit('bench', [command]).result()
+    elapsed = time.perf_counter() - started
+    pool.executor.shutdown()
+    return elapsed
+
+
+def bench_merge(ctx):
+    """ffmpeg stream-copy mux of separate video and audio"""
+    output = os.path.join(ctx.scratch, 'merged.mp4')
+    return _postprocess(ctx, app_threaded.merge_command(
+        ctx.ffmpeg, ctx.server.path('video.mp4'), ctx.server.path('audio.m4a'), output))
+
+
+def bench_mp3_encode(ctx):
+    """ffmpeg audio conversion to mp3"""
+    output = os.path.join(ctx.scratch, 'audio.mp3')
+    return _postprocess(ctx, app_threaded.audio_command(ctx.ffmpeg, ctx.server.path('audio.m4a'), output, 'mp3'))
+
+
+def bench_m4a_remux(ctx):
+    """ffmpeg stream copy of AAC audio into m4a (the no-re-encode fast path)"""
+    output = os.path.join(ctx.scratch, 'audio.m4a')
+    return _postprocess(ctx, app_threaded.audio_command(
+        ctx.ffmpeg, ctx.server.path('audio.m4a'), output, 'm4a', copy=True))
+
+
+def bench_startup_import(ctx):
+    """Warm start of a fresh interpreter up to a usable DownloadWorker"""
+    return startup.measure('import', runs=3)['warm']['median'] * 1000
+
+
+# name: (function, unit, better, needs ffmpeg)
+CASES = {
+    'progressive_throughput': (bench_progressive_throughput, 'MB/s', 'higher', False),
+    'dash_download': (bench_dash_download, 's', 'lower', True),
+    'hls_download': (bench_hls_download, 's', 'lower', True),
+    'progress_overhead': (bench_progress_overhead, 'us/call', 'lower', False),
+    'extract_formats': (bench_extract_formats, 'ms', 'lower', False),
+    'merge': (bench_merge, 's', 'lower', True),
+    'mp3_encode': (bench_mp3_encode, 's', 'lower', True),
+    'm4a_remux': (bench_m4a_remux, 's', 'lower', True),
+    'startup_import': (bench_startup_import, 'ms', 'lower', False),
+}
+
+
+def run_cases(names, repeat, size_mb):
+    """Best result of each case; skipped cases map to None"""
+    probe = app_threaded.probe_ffmpeg()
+    ffmpeg = probe['ffmpeg'] if probe else None
+    results = {}
+    with MediaServer(size_mb=size_mb, ffmpeg=ffmpeg) as server:
+        ctx = Context(server, ffmpeg)
+        try:
+            for name in names:
+                function, unit, better, needs_ffmpeg = CASES[name]
+                if needs_ffmpeg and not ffmpeg:
+                    results[name] = None
+                    continue
+                samples = [function(ctx) for _ in range(repeat)]
+                best = max(samples) if better == 'higher' else min(samples)
+                results[name] = {'value': round(best, 4), 'unit': unit, 'better': better}
+        finally:
+            shutil.rmtree(ctx.scratch, ignore_errors=True)
+    return results
+
+
+def compare(results, baselines, tolerance):
+    """(name, result, baseline, regressed) for every case that ran"""
+    rows = []
+    for name, result in results.items():
+        if result is None:
+            continue
+        baseline = baselines.get(name)
+        regressed = False
+        if baseline:
+            if result['better'] == 'higher':
+                regressed = result['value'] < baseline['value'] * (1 - tolerance)
+            else:
+                regressed = result['value'] > baseline['value'] * (1 + tolerance)
+        rows.append((name, result, baseline, regressed))
+    return rows
+
+
+def load_baselines():
+    try:
+        with open(BASELINES_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline download pipeline benchmarks")
+    parser.add_argument('--only', action='append', choices=sorted(CASES), help="Run only this case (repeatable)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case; the best counts")
+    parser.add_argument('--size-mb', type=int, default=64, help="Size of the progressive test file")
+    parser.add_argument('--tolerance', type=float, help="Allowed regression as a fraction "
+                                                         f"(default: baselines file, else {DEFAULT_TOLERANCE})")
+    parser.add_argument('--update-baselines', action='store_true', help="Store these results as the new baselines")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    stored = load_baselines()
+    tolerance = args.tolerance if args.tolerance is not None else stored.get('tolerance', DEFAULT_TOLERANCE)
+    results = run_cases(args.only or list(CASES), args.repeat, args.size_mb)
+
+    if args.update_baselines:
+        baselines = dict(stored.get('results', {}))
+        baselines.update({name: result for name, result in results.items() if result is not None})
+        with open(BASELINES_FILE, 'w') as f:
+            json.dump({'tolerance': tolerance, 'results': baselines}, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    rows = compare(results, stored.get('results', {}), tolerance)
+    failed = [name for name, _, _, regressed in rows if regressed and not args.update_baselines]
+    if args.json:
+        print(json.dumps({'tolerance': tolerance, 'results': results, 'regressions': failed}, indent=2))
+    else:
+        for name, result in results.items():
+            if result is None:
+                print(f"{name:24} skipped (ffmpeg not found)")
+        for name, result, baseline, regressed in rows:
+            line = f"{name:24} {result['value']:10.3f} {result['unit']:8}"
+            if baseline:
+                change = (result['value'] / baseline['value'] - 1) * 100 if baseline['value'] else 0.0
+                line += f" baseline {baseline['value']:10.3f} ({change:+.0f}%)"
+            if regressed:
+                line += "  REGRESSION"
+            print(line)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
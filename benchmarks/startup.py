@@ -0,0 +1,129 @@
+"""Startup benchmark: cold and warm launch time
+
+Every sample is a fresh interpreter. Two things are timed from process
+spawn:
+
+- import: `import app_threaded` plus a DownloadWorker (what --batch pays).
+- first_frame: the GUI window built and idle in mainloop (needs a display).
+
+"Cold" runs get an empty HOME (no config, ffmpeg probe or caches) and an
+empty bytecode cache, like a first launch after installing. "Warm" runs
+reuse one HOME and bytecode cache that an untimed launch populated first.
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = {
+    'import': """
+import sys
+sys.path.insert(0, {repo!r})
+import app_threaded
+app_threaded.DownloadWorker(lambda event, data: None, quiet=True)
+print("READY", flush=True)
+""",
+    'first_frame': """
+import os, sys
+sys.path.insert(0, {repo!r})
+import app_threaded
+app = app_threaded.YouTubeDownloaderApp()
+def ready():
+    print("READY", flush=True)
+    os._exit(0)
+app.after(0, lambda: app.after_idle(ready))
+app.mainloop()
+""",
+}
+
+
+def has_display():
+    """Whether a Tk window can be opened here"""
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+        return False
+    try:
+        import tkinter
+        tkinter.Tk().destroy()
+        return True
+    except Exception:
+        return False
+
+
+def launch(mode, home, pycache):
+    """Seconds from spawning a child interpreter until it reports READY"""
+    env = dict(os.environ, HOME=home, USERPROFILE=home, PYTHONPYCACHEPREFIX=pycache)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # Warm runs depend on the bytecode cache
+    started = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, '-c', CHILD[mode].format(repo=REPO)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env, cwd=home
+    )
+    try:
+        for line in child.stdout:
+            if line.startswith("READY"):
+                return time.perf_counter() - started
+        raise RuntimeError(f"{mode} launch exited with code {child.wait()} before it was ready")
+    finally:
+        child.kill()
+        child.wait()
+
+
+def measure(mode, runs):
+    """Cold and warm samples (seconds) for one mode"""
+    cold = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as home, tempfile.TemporaryDirectory() as pycache:
+            cold.append(launch(mode, home, pycache))
+    warm = []
+    with tempfile.TemporaryDirectory() as home, tempfile.TemporaryDirectory() as pycache:
+        launch(mode, home, pycache)
+        for _ in range(runs):
+            warm.append(launch(mode, home, pycache))
+    return {
+        'cold': {'median': statistics.median(cold), 'min': min(cold)},
+        'warm': {'median': statistics.median(warm), 'min': min(warm)},
+    }
+
+
+def run(runs=5, modes=None):
+    """Results keyed by mode; first_frame is skipped without a display"""
+    modes = modes or ['import', 'first_frame']
+    results = {}
+    for mode in modes:
+        if mode == 'first_frame' and not has_display():
+            results[mode] = {'skipped': "no display"}
+            continue
+        results[mode] = measure(mode, runs)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time cold and warm startup")
+    parser.add_argument('--runs', type=int, default=5, help="Samples per mode and temperature")
+    parser.add_argument('--mode', action='append', choices=sorted(CHILD), help="Only this mode (repeatable)")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args(argv)
+    results = run(args.runs, args.mode)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for mode, result in results.items():
+        if 'skipped' in result:
+            print(f"{mode:12} skipped ({result['skipped']})")
+            continue
+        for temperature in ('cold', 'warm'):
+            stats = result[temperature]
+            print(f"{mode:12} {temperature}  median {stats['median'] * 1000:7.1f} ms  min {stats['min'] * 1000:7.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())